@@ -0,0 +1,131 @@
+import Trace
+
+
+class Animation:
+    def __init__(self, duration=0, name=None):
+        self.duration = duration
+        self.name = name if name is not None else type(self).__name__
+        # set by the canvas so traces can be grouped by scene
+        self.scene = None
+
+    def update(self, progress, previous=None):
+        pass
+
+
+class Pause(Animation):
+    pass
+
+
+class Call(Animation):
+    def __init__(self, function):
+        super().__init__(0, function_name(function))
+        self.function = function
+
+    def update(self, progress, previous=None):
+        if previous is None:
+            self.function()
+
+
+class Tween(Animation):
+    # function(progress, previous) draws the state at progress; previous is the progress it
+    # last drew, or None when nothing has been drawn yet
+    def __init__(self, function, duration):
+        super().__init__(duration, function_name(function))
+        self.function = function
+
+    def update(self, progress, previous=None):
+        self.function(progress, previous)
+
+
+class Parallel(Animation):
+    def __init__(self, animations):
+        super().__init__(max(animation.duration for animation in animations),
+                         " + ".join(animation.name for animation in animations))
+        self.animations = animations
+
+    def update(self, progress, previous=None):
+        for animation in self.animations:
+            animation.update(self.scale(animation, progress), self.scale(animation, previous))
+
+    def scale(self, animation, progress):
+        if progress is None or animation.duration == 0:
+            return progress if progress is None else 1
+        return min(1, progress * self.duration / animation.duration)
+
+
+class Scheduler:
+    def __init__(self, animations):
+        self.animations = list(animations)
+        self.starts = []
+        start = 0
+        for animation in self.animations:
+            self.starts.append(start)
+            start += animation.duration
+        self.duration = start
+        self.elapsed = 0
+        self.index = 0
+        self.previous = None
+        self.scene = None
+        self.scene_start = None
+        self.replaying = False
+
+    def update(self, dt):
+        self.advance_to(self.elapsed + dt)
+
+    def advance_to(self, elapsed):
+        self.elapsed = elapsed
+        while self.index < len(self.animations):
+            animation = self.animations[self.index]
+            start = self.starts[self.index]
+            self.enter_scene(animation.scene)
+            if self.elapsed < start + animation.duration:
+                progress = (self.elapsed - start) / animation.duration
+                with Trace.span(animation.name, 'animation', **self.trace_args(animation)):
+                    animation.update(progress, self.previous)
+                self.previous = progress
+                return
+
+            with Trace.span(animation.name, 'animation', **self.trace_args(animation)):
+                animation.update(1, self.previous)
+            self.index += 1
+            self.previous = None
+        self.enter_scene(None)
+
+    def trace_args(self, animation):
+        if self.replaying:
+            return {'scene': animation.scene, 'replay': True}
+        return {'scene': animation.scene}
+
+    def enter_scene(self, scene):
+        # a scene span runs from the first update of one scene to the first update of the next,
+        # updates replayed by a seek redraw earlier frames and never start one
+        if scene != self.scene:
+            self.close_scene()
+            self.scene = scene
+        if self.scene_start is None and scene is not None and not self.replaying:
+            self.scene_start = Trace.now()
+
+    def close_scene(self):
+        if self.scene_start is not None:
+            Trace.record(self.scene, 'scene', self.scene_start, Trace.now() - self.scene_start)
+            self.scene_start = None
+
+    def seek(self, elapsed):
+        # replay every animation up to elapsed from nothing, so a frame depends only on its time
+        self.close_scene()
+        self.index = 0
+        self.previous = None
+        self.scene = None
+        self.replaying = True
+        try:
+            self.advance_to(elapsed)
+        finally:
+            self.replaying = False
+
+    def finished(self):
+        return self.index >= len(self.animations)
+
+
+def function_name(function):
+    function = getattr(function, 'func', function)
+    return getattr(function, '__qualname__', repr(function))
@@ -0,0 +1,84 @@
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import Calendar
+import Data
+import Providers
+from MarketCaps import MarketCapStore
+from RangeStore import RangeStore
+
+
+def backfill(start_date, end_date, provider=None, tickers=None, directory='DailyData', max_days=2, max_workers=8,
+             force=False):
+    provider = provider if provider is not None else Providers.YFinanceProvider()
+    if tickers is None:
+        with open('spx.txt', 'r') as file:
+            tickers = [line.strip() for line in file if line.strip()]
+
+    # one schedule covers the range, the session before its first day and the one after its last,
+    # and stays cached for every session's own calendar lookups
+    calendar = Calendar.calendar_between(start_date, end_date)
+    all_sessions = [session[0] for session in calendar.sessions if session[0] <= end_date]
+    store = RangeStore(directory)
+    stored = set(store.sessions())
+    jobs = []
+    for previous_session, session in zip(all_sessions, all_sessions[1:]):
+        if session < start_date:
+            continue
+        if not force and session.strftime('%Y-%m-%d') in stored:
+            print(f"Skipping {session}, already stored")
+            continue
+        jobs.append((session, previous_session))
+
+    if not jobs:
+        print("Nothing to backfill")
+        return []
+
+    # refresh market caps once up front so the concurrent days don't all refetch them
+    market_caps = MarketCapStore(os.path.join(directory, 'market_caps.json'))
+    stale_tickers = market_caps.stale_tickers(tickers)
+    if stale_tickers:
+        market_caps.refresh(stale_tickers, provider, max_workers)
+
+    def run_session(job):
+        session, previous_session = job
+        print(f"Backfilling {session}")
+        Data.SP500Data(max_workers=max_workers, provider=provider, tickers=tickers, date=session,
+                       last_close=previous_session, directory=directory)
+        return session
+
+    with ThreadPoolExecutor(max_workers=max_days) as executor:
+        finished = list(executor.map(run_session, jobs))
+
+    stored = set(store.sessions())
+    missing = [session for session in finished if session.strftime('%Y-%m-%d') not in stored]
+    for session in missing:
+        print(f"{session} was not saved, rerun to resume it from its checkpoint")
+    return finished
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch and store every session between two dates.")
+    parser.add_argument('start_date', help="first session, YYYY-MM-DD")
+    parser.add_argument('end_date', help="last session, YYYY-MM-DD")
+    parser.add_argument('--directory', default='DailyData')
+    parser.add_argument('--days', type=int, default=2, help="sessions fetched at the same time")
+    parser.add_argument('--workers', type=int, default=8, help="ticker fetches per session")
+    parser.add_argument('--cache', help="record provider responses to this directory")
+    parser.add_argument('--force', action='store_true', help="refetch sessions already in the index")
+    args = parser.parse_args()
+
+    provider = Providers.YFinanceProvider()
+    if args.cache:
+        provider = Providers.RecordingProvider(provider, args.cache)
+
+    start_date = datetime.strptime(args.start_date, '%Y-%m-%d').date()
+    end_date = datetime.strptime(args.end_date, '%Y-%m-%d').date()
+    backfill(start_date, end_date, provider, directory=args.directory, max_days=args.days,
+             max_workers=args.workers, force=args.force)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+REPO_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+SUITE_SIZES = (500, 1000, 3000)
+SUITE_GAP_FRACTIONS = (0.0, 0.05)
+SUITE_DATE = date(2024, 9, 20)
+SUITE_LAST_CLOSE = date(2024, 9, 19)
+
+# each snippet runs in a fresh interpreter and prints the seconds it took, so nothing is already imported
+STARTUP_SNIPPETS = {
+    'import_view': """
+import time
+start = time.perf_counter()
+import View
+print(time.perf_counter() - start)
+""",
+    'import_data': """
+import time
+start = time.perf_counter()
+import Data
+print(time.perf_counter() - start)
+""",
+    'render_only_first_frame': """
+import time
+start = time.perf_counter()
+import Conductor
+import View
+data_filepath = Conductor.current_snapshot({directory!r})
+if data_filepath is None:
+    raise SystemExit("no current snapshot in the manifest")
+canvas = View.Canvas(data_filepath=data_filepath, headless=True)
+canvas.render_frame(0, 60)
+print(time.perf_counter() - start)
+""",
+    'fetch_path_first_frame': """
+import time
+start = time.perf_counter()
+import os
+import Data
+import View
+data_date = Data.StockData.get_last_trading_day().strftime('%Y-%m-%d')
+canvas = View.Canvas(data_filepath=os.path.join({directory!r}, data_date + '.snap'), headless=True)
+canvas.render_frame(0, 60)
+print(time.perf_counter() - start)
+""",
+}
+
+
+def run_snippet(snippet, working_directory):
+    environment = dict(os.environ, SDL_VIDEODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1',
+                       PYTHONPATH=os.pathsep.join([REPO_DIRECTORY, os.environ.get('PYTHONPATH', '')]))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', snippet], cwd=working_directory, env=environment,
+                            capture_output=True, text=True)
+    wall_time = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "snippet failed")
+    return float(result.stdout.strip().splitlines()[-1]), wall_time
+
+
+def summarize(runs):
+    return {'median': statistics.median(runs), 'min': min(runs), 'max': max(runs), 'runs': runs}
+
+
+def benchmark_startup(directory='DailyData', repeat=5, names=None):
+    directory = os.path.abspath(directory)
+    working_directory = os.path.dirname(directory)
+    results = {}
+    for name, snippet in STARTUP_SNIPPETS.items():
+        if names is not None and name not in names:
+            continue
+        timings, wall_times = [], []
+        try:
+            for _ in range(repeat):
+                timing, wall_time = run_snippet(snippet.format(directory=directory), working_directory)
+                timings.append(timing)
+                wall_times.append(wall_time)
+        except RuntimeError as e:
+            print(f"{name}: skipped, {e}", file=sys.stderr)
+            continue
+        results[name] = {'seconds': summarize(timings), 'process_seconds': summarize(wall_times)}
+        print(f"{name}: {results[name]['seconds']['median'] * 1000:.0f} ms in process, "
+              f"{results[name]['process_seconds']['median'] * 1000:.0f} ms including interpreter start",
+              file=sys.stderr)
+    return results
+
+
+def time_call(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def time_frames(function, num_frames, repeat):
+    # seconds per call of function(progress, previous), stepping progress the way a Tween does
+    def run():
+        previous = None
+        for frame in range(num_frames + 1):
+            progress = frame / num_frames
+            function(progress, previous)
+            previous = progress
+
+    summary = time_call(run, repeat)
+    return {key: value / (num_frames + 1) if key != 'runs' else [run / (num_frames + 1) for run in value]
+            for key, value in summary.items()}
+
+
+def benchmark_case(num_tickers, gap_fraction, directory, repeat=3, fps=60):
+    import Data
+    import Providers
+    import View
+
+    provider = Providers.SyntheticProvider(num_tickers=num_tickers, gap_fraction=gap_fraction)
+    results = {}
+
+    # fetch: the whole ingest against the generated provider, no network involved
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet):
+        start = time.perf_counter()
+        data = Data.SP500Data(provider=provider, tickers=provider.tickers, date=SUITE_DATE,
+                              last_close=SUITE_LAST_CLOSE, directory=directory)
+        results['fetch'] = summarize([time.perf_counter() - start])
+    data_filepath = data.snapshot_filepath
+
+    # transform: the per-stock interpolation against the batched one over the same gapped rows
+    bars = [provider.get_minute_bars(ticker, SUITE_DATE) for ticker in provider.tickers]
+    previous_closes = [provider.get_previous_close(ticker, SUITE_LAST_CLOSE) for ticker in provider.tickers]
+    entries = [{'ticker': ticker, 'minutes': minutes, 'percents': [(close - previous_close) / previous_close
+                                                                   for close in closes]}
+               for ticker, (minutes, closes), previous_close in zip(provider.tickers, bars, previous_closes)]
+
+    def interpolate_each():
+        for entry in entries:
+            stock = Data.StockData.from_checkpoint(entry, SUITE_DATE, SUITE_LAST_CLOSE)
+            stock.interpolate_missing_data()
+
+    def interpolate_batch():
+        Data.interpolate_universe([entry['minutes'] for entry in entries], [entry['percents'] for entry in entries])
+
+    results['interpolate_each'] = time_call(interpolate_each, repeat)
+    results['interpolate_batch'] = time_call(interpolate_batch, repeat)
+
+    with contextlib.redirect_stdout(quiet):
+        results['save_data'] = time_call(data.save_data, repeat)
+
+        # load: snapshot read, layout, detail level and scene construction
+        results['canvas_init'] = time_call(lambda: View.Canvas(data_filepath=data_filepath, headless=True), repeat)
+        canvas = View.Canvas(data_filepath=data_filepath, headless=True)
+
+    heatmap = canvas.draw_objects['Heatmap']
+    timeline = canvas.draw_objects['Timeline']
+    stock_block = canvas.draw_objects['Main Stock Block']
+    reveal_frames = max(1, round(len(canvas.snapshot.minutes) / 60 * fps))
+
+    def reveal(progress, previous):
+        timeline.reveal(progress, previous)
+        heatmap.reveal(progress, previous)
+        canvas.compositor.present()
+
+    results['scene_1_frame'] = time_frames(reveal, reveal_frames, repeat)
+    results['split_block'] = time_call(lambda: stock_block.split_block(num_blocks=4, separation=40), repeat)
+    results['draw_subblocks_frame'] = time_frames(stock_block.draw_subblocks, round(2.6 * fps), repeat)
+    results['fade_out_frame'] = time_frames(timeline.fade_out, round(1.4 * fps), repeat)
+    results['recolor'] = time_call(lambda: canvas.set_color_scale('blue_orange'), repeat)
+    results['level'] = {'rows': len(canvas.snapshot.tickers), 'columns': len(canvas.snapshot.minutes)}
+    return results
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    # the calendar cache is written relative to the working directory, so a case runs inside its own
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def benchmark_suite(sizes=SUITE_SIZES, gap_fractions=SUITE_GAP_FRACTIONS, repeat=3):
+    results = {}
+    for num_tickers in sizes:
+        for gap_fraction in gap_fractions:
+            name = f"{num_tickers}_tickers_{int(gap_fraction * 100)}pct_gaps"
+            with tempfile.TemporaryDirectory() as directory, working_directory(directory):
+                results[name] = benchmark_case(num_tickers, gap_fraction, directory, repeat)
+            print(f"{name}: " + ", ".join(f"{stage} {timing['median'] * 1000:.2f} ms"
+                                          for stage, timing in results[name].items() if 'median' in timing),
+                  file=sys.stderr)
+    return results
+
+
+def compare_results(old, new, threshold=0.1):
+    # stages whose median got slower than threshold (a fraction) between two result files
+    regressions = []
+    old_results, new_results = old['results'], new['results']
+    for case in sorted(set(old_results) & set(new_results)):
+        for stage in sorted(set(old_results[case]) & set(new_results[case])):
+            old_timing, new_timing = old_results[case][stage], new_results[case][stage]
+            if 'seconds' in old_timing:
+                old_timing, new_timing = old_timing['seconds'], new_timing['seconds']
+            if 'median' not in old_timing or old_timing['median'] <= 0:
+                continue
+            change = new_timing['median'] / old_timing['median'] - 1
+            line = (f"{case} {stage}: {old_timing['median'] * 1000:.2f} ms -> {new_timing['median'] * 1000:.2f} ms "
+                    f"({change:+.0%})")
+            print(line, file=sys.stderr)
+            if change > threshold:
+                regressions.append(line)
+    return regressions
+
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def write_results(results, output_filepath=None):
+    text = json.dumps(results, indent=2)
+    if output_filepath is None:
+        print(text)
+    else:
+        with open(output_filepath, 'w') as file:
+            file.write(text + "\n")
+        print(f"Results written to {output_filepath}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the pipeline and write the results as JSON.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    startup = subparsers.add_parser('startup', help="cold start: imports and time to the first rendered frame")
+    startup.add_argument('--directory', default='DailyData', help="directory holding the manifest and snapshots")
+    startup.add_argument('--repeat', type=int, default=5)
+    startup.add_argument('--only', nargs='+', choices=list(STARTUP_SNIPPETS), help="run just these measurements")
+    startup.add_argument('--output', help="write JSON here instead of stdout")
+
+    suite = subparsers.add_parser('suite', help="fetch, transform, load and render stages on generated snapshots")
+    suite.add_argument('--sizes', type=int, nargs='+', default=list(SUITE_SIZES))
+    suite.add_argument('--gaps', type=float, nargs='+', default=list(SUITE_GAP_FRACTIONS),
+                       help="fraction of minute bars dropped from each ticker")
+    suite.add_argument('--repeat', type=int, default=3)
+    suite.add_argument('--output', help="write JSON here instead of stdout")
+
+    compare = subparsers.add_parser('compare', help="compare two result files and fail on regressions")
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=0.1, help="allowed slowdown as a fraction")
+
+    args = parser.parse_args()
+    if args.command == 'suite':
+        results = {'benchmark': 'suite', 'environment': environment_info(), 'repeat': args.repeat,
+                   'results': benchmark_suite(args.sizes, args.gaps, args.repeat)}
+        write_results(results, args.output)
+    elif args.command == 'compare':
+        with open(args.old, 'r') as file:
+            old = json.load(file)
+        with open(args.new, 'r') as file:
+            new = json.load(file)
+        regressions = compare_results(old, new, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} stages slower by more than {args.threshold:.0%}:", file=sys.stderr)
+            for line in regressions:
+                print("  " + line, file=sys.stderr)
+            sys.exit(1)
+    elif args.command == 'startup':
+        results = {'benchmark': 'startup', 'environment': environment_info(), 'repeat': args.repeat,
+                   'results': benchmark_startup(args.directory, args.repeat, args.only)}
+        write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pytz
+
+EASTERN = pytz.timezone('US/Eastern')
+REGULAR_SESSION_LENGTH = 390
+CACHE_FILEPATH = os.path.join('DailyData', 'calendar.json')
+
+
+class TradingCalendar:
+    def __init__(self, sessions):
+        # sessions: list of (date, market_open, market_close) with US/Eastern datetimes
+        self.sessions = sorted(sessions)
+        self.session_index = {session[0]: session for session in self.sessions}
+
+    @classmethod
+    def build(cls, start_date, end_date):
+        import pandas_market_calendars as mcal
+
+        nyse = mcal.get_calendar('NYSE')
+        schedule = nyse.schedule(start_date=start_date, end_date=end_date)
+        sessions = []
+        for market_open, market_close in zip(schedule['market_open'], schedule['market_close']):
+            market_open = market_open.tz_convert(EASTERN).to_pydatetime()
+            market_close = market_close.tz_convert(EASTERN).to_pydatetime()
+            sessions.append((market_open.date(), market_open, market_close))
+        return cls(sessions)
+
+    @classmethod
+    def from_dict(cls, data):
+        sessions = []
+        for session_date, market_open, market_close in data['sessions']:
+            sessions.append((datetime.strptime(session_date, '%Y-%m-%d').date(),
+                             datetime.fromisoformat(market_open).astimezone(EASTERN),
+                             datetime.fromisoformat(market_close).astimezone(EASTERN)))
+        return cls(sessions)
+
+    def to_dict(self):
+        return {
+            'sessions': [[session_date.strftime('%Y-%m-%d'), market_open.isoformat(), market_close.isoformat()]
+                         for session_date, market_open, market_close in self.sessions]
+        }
+
+    def completed_sessions(self, present=None):
+        present = present if present is not None else datetime.now(EASTERN)
+        return [session for session in self.sessions if session[2] <= present]
+
+    def last_session(self, present=None):
+        return self.completed_sessions(present)[-1][0]
+
+    def previous_session(self, present=None):
+        return self.completed_sessions(present)[-2][0]
+
+    def sessions_between(self, start_date, end_date):
+        return [session[0] for session in self.sessions if start_date <= session[0] <= end_date]
+
+    def session_length(self, session_date):
+        if session_date not in self.session_index:
+            return REGULAR_SESSION_LENGTH
+        _, market_open, market_close = self.session_index[session_date]
+        return int((market_close - market_open).total_seconds() // 60)
+
+    def session_minutes(self, session_date):
+        market_open = self.session_index[session_date][1] if session_date in self.session_index else None
+        start = market_open.hour * 60 + market_open.minute if market_open is not None else 9 * 60 + 30
+        return [f"{(start + i) // 60:02d}:{(start + i) % 60:02d}" for i in range(self.session_length(session_date))]
+
+    def is_early_close(self, session_date):
+        return self.session_length(session_date) < REGULAR_SESSION_LENGTH
+
+    def covers(self, session_date):
+        # also holds the session before session_date, which the previous close comes from
+        return bool(self.sessions) and self.sessions[0][0] < session_date <= self.sessions[-1][0]
+
+    def next_close(self, session_date):
+        if not self.sessions or self.sessions[0][0] > session_date:
+            return None
+        for date, _, market_close in self.sessions:
+            if date > session_date:
+                return market_close
+        return None
+
+    def early_closes(self):
+        return [session[0] for session in self.sessions if self.is_early_close(session[0])]
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+def get_calendar(cache_filepath=CACHE_FILEPATH, lookback_days=10, lookahead_days=14):
+    with _calendar_lock:
+        return _get_calendar(cache_filepath, lookback_days, lookahead_days)
+
+def _get_calendar(cache_filepath, lookback_days, lookahead_days):
+    global _calendar
+    today = datetime.now(EASTERN).date().strftime('%Y-%m-%d')
+    if _calendar is not None and _calendar[0] == today:
+        return _calendar[1]
+
+    calendar = None
+    if os.path.exists(cache_filepath):
+        try:
+            with open(cache_filepath, 'r') as file:
+                data = json.load(file)
+            if data.get('computed_on') == today and data.get('lookahead_days') == lookahead_days:
+                calendar = TradingCalendar.from_dict(data)
+        except (ValueError, KeyError) as e:
+            print(f"Ignoring unreadable calendar cache {cache_filepath}: {e}")
+
+    if calendar is None:
+        # the upcoming sessions come along so a save can tell when its snapshot goes stale
+        present = datetime.now(EASTERN)
+        calendar = TradingCalendar.build(present - timedelta(days=lookback_days),
+                                         present + timedelta(days=lookahead_days))
+        try:
+            os.makedirs(os.path.dirname(cache_filepath) or '.', exist_ok=True)
+            with open(cache_filepath, 'w') as file:
+                json.dump(dict(calendar.to_dict(), computed_on=today, lookahead_days=lookahead_days), file)
+        except OSError as e:
+            print(f"An error occurred while caching the calendar: {e}")
+
+    _calendar = (today, calendar)
+    return calendar
+
+_range_calendars = []
+
+def calendar_between(start_date, end_date, lookback_days=10, lookahead_days=14):
+    # one schedule for a whole range of past sessions, kept for every later lookup that falls inside it
+    calendar = TradingCalendar.build(start_date - timedelta(days=lookback_days),
+                                     end_date + timedelta(days=lookahead_days))
+    with _calendar_lock:
+        _range_calendars.append(calendar)
+    return calendar
+
+def cached_calendars():
+    calendar = get_calendar()
+    with _calendar_lock:
+        return [calendar] + _range_calendars
+
+def calendar_for(session_date, lookback_days=10):
+    for calendar in cached_calendars():
+        if calendar.covers(session_date):
+            return calendar
+    # past sessions fall outside the cached window, build a small schedule around them instead
+    return calendar_between(session_date, session_date, lookback_days)
+
+def session_before(session_date):
+    sessions = [session[0] for session in calendar_for(session_date).sessions if session[0] < session_date]
+    return sessions[-1]
+
+def next_session_close(session_date, lookahead_days=14):
+    for calendar in cached_calendars():
+        market_close = calendar.next_close(session_date)
+        if market_close is not None:
+            return market_close
+    return calendar_between(session_date, session_date, lookahead_days=lookahead_days).next_close(session_date)
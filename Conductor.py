@@ -1,16 +1,61 @@
 # Wash St vs SJS 54 - 52. insane game
-import Data
-import View
 import os
+from datetime import datetime, timezone
+
+import View
+from RangeStore import RangeStore, read_manifest
 
-#data_file = "2024-09-20.json"
-data_file = Data.StockData.get_last_trading_day().strftime('%Y-%m-%d') + ".json"
+#data_file = "2024-09-20.snap"
 directory = 'DailyData'
-data_filepath = os.path.join(directory, data_file)
-print(data_file)
 
-if not os.path.exists(data_filepath):
-    Data.SP500Data()
 
-canvas = View.Canvas(data_filepath=data_filepath)
-canvas.run()
\ No newline at end of file
+def current_snapshot(directory='DailyData'):
+    # the newest snapshot stays current until the next session closes, so no calendar is needed to trust it
+    manifest = read_manifest(directory)
+    if manifest is None or manifest.get('valid_until') is None:
+        return None
+    data_filepath = os.path.join(directory, manifest['file'])
+    if datetime.now(timezone.utc) >= datetime.fromisoformat(manifest['valid_until']) or \
+            not os.path.exists(data_filepath):
+        return None
+    return data_filepath
+
+
+def main():
+    data_filepath = current_snapshot(directory)
+    if data_filepath is not None:
+        print(data_filepath)
+        canvas = View.Canvas(data_filepath=data_filepath)
+        canvas.run()
+        return
+
+    # only a fetch needs yfinance, pandas and the exchange calendar
+    import Calendar
+    import Data
+    import Snapshot
+    import Stream
+
+    last_trading_day = Data.StockData.get_last_trading_day()
+    data_date = last_trading_day.strftime('%Y-%m-%d')
+    data_filepath = os.path.join(directory, data_date + ".snap")
+    json_filepath = os.path.join(directory, data_date + ".json")
+    print(data_filepath)
+
+    if not os.path.exists(data_filepath) and os.path.exists(json_filepath):
+        Snapshot.convert_json(json_filepath)
+
+    if os.path.exists(data_filepath):
+        # snapshots saved before the manifest existed get one, so the next start skips all of this
+        RangeStore(directory).update_manifest(data_date, data_date + ".snap",
+                                              Calendar.next_session_close(last_trading_day))
+        canvas = View.Canvas(data_filepath=data_filepath)
+        canvas.run()
+    else:
+        # open the window right away and fill rows in while the day is still being fetched
+        session, fetcher = Stream.start_session(date=last_trading_day, directory=directory)
+        canvas = View.Canvas(snapshot=session.snapshot, level_of_detail=False)
+        canvas.run_streaming(session, fetcher)
+
+
+if __name__ == '__main__':
+    main()
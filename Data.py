@@ -1,45 +1,196 @@
 import json
-import yfinance as yf
-from datetime import datetime, timedelta
-import pytz
-import pandas_market_calendars as mcal
+import numpy as np
+import Calendar
+import Providers
+from MarketCaps import MarketCapStore
 import os
+import time
+import Trace
+from Snapshot import Snapshot
+from RangeStore import RangeStore
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+MARKET_OPEN = 9 * 60 + 30
 
 class SP500Data:
-    def __init__(self):
+    def __init__(self, max_workers=8, retries=3, backoff=1.0, export_json=False, provider=None, tickers=None,
+                 date=None, last_close=None, directory="DailyData", max_failures=10, stream=None):
         self.file_path = "spx.txt"
         self.stock_objects = {}
+        self.provider = provider if provider is not None else Providers.YFinanceProvider()
+        self.tickers = tickers
+        self.date = date
+        self.last_close = last_close
+        self.directory = directory
+        self.market_caps = MarketCapStore(os.path.join(directory, 'market_caps.json'))
+        self.export_json = export_json
+        self.failures = {}
+        self.max_failures = max_failures
+        self.stream = stream
+        self.snapshot_filepath = None
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
         self._import_stocks()
 
     def _import_stocks(self):
         try:
-            with open(self.file_path, 'r') as file:
-                tickers = [line.strip() for line in file]
-                for ticker in tickers:
-                    stock_data = StockData(ticker)
+            if self.tickers is None:
+                with open(self.file_path, 'r') as file:
+                    self.tickers = [line.strip() for line in file if line.strip()]
+            tickers = self.tickers
+
+            if self.date is None:
+                self.date = StockData.get_last_trading_day()
+                self.last_close = StockData.get_last_trading_day(previous_day=True)
+            elif self.last_close is None:
+                self.last_close = Calendar.session_before(self.date)
+            date, last_close = self.date, self.last_close
+
+            # market caps only order the rows, so they refresh on their own schedule next to the price fetch
+            stale_tickers = self.market_caps.stale_tickers(tickers)
+            refresh_thread = None
+            if stale_tickers:
+                refresh_thread = self.market_caps.refresh_in_background(stale_tickers, self.provider, self.max_workers)
+
+            # tickers finished by an earlier, interrupted run are read back instead of refetched
+            checkpoint_filepath = self.checkpoint_path()
+            results = self.load_checkpoint(checkpoint_filepath)
+            remaining = [ticker for ticker in tickers if ticker not in results]
+            if results:
+                print(f"Resuming from {checkpoint_filepath}: {len(results)} done, {len(remaining)} to fetch")
+            # a streaming view draws rows as they arrive, starting with what the checkpoint already has
+            if self.stream is not None:
+                for stock_data in results.values():
+                    self.stream.put((stock_data.ticker, stock_data.minutes, stock_data.percents))
+
+            os.makedirs(self.directory, exist_ok=True)
+            with open(checkpoint_filepath, 'a') as checkpoint, \
+                    ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self._fetch_stock, ticker, date, last_close) for ticker in remaining]
+                for future in as_completed(futures):
+                    stock_data = future.result()
+                    results[stock_data.ticker] = stock_data
+                    if stock_data.error is None:
+                        checkpoint.write(json.dumps({'ticker': stock_data.ticker, 'minutes': stock_data.minutes,
+                                                     'percents': stock_data.percents}) + "\n")
+                        checkpoint.flush()
+                        if self.stream is not None:
+                            self.stream.put((stock_data.ticker, stock_data.minutes, stock_data.percents))
+
+            # keep spx.txt order so ties in market cap sort the same as a sequential run
+            for ticker in tickers:
+                stock_data = results[ticker]
+                if stock_data.error is None:
                     self.stock_objects[ticker] = stock_data
-            self.save_data()
+                else:
+                    self.failures[ticker] = stock_data.error
+
+            if refresh_thread is not None:
+                with Trace.span('wait_market_caps', 'data'):
+                    refresh_thread.join()
+            for ticker, stock_data in self.stock_objects.items():
+                stock_data.market_cap = self.market_caps.get(ticker, 0)
+
+            self.print_failures()
+            if len(self.failures) > self.max_failures:
+                print(f"Not saving a snapshot with {len(self.failures)} failed tickers, "
+                      f"rerun to resume from {checkpoint_filepath}")
+                return
+
+            with Trace.span('interpolate', 'data', tickers=len(self.stock_objects)):
+                self.interpolate_missing_data()
+            with Trace.span('save_data', 'data'):
+                saved = self.save_data()
+            if saved:
+                os.remove(checkpoint_filepath)
 
         except FileNotFoundError:
             print(f"Error: The file {self.file_path} was not found.")
         except Exception as e:
             print(f"An error occurred: {e}")
 
+    def checkpoint_path(self):
+        return os.path.join(self.directory, self.date.strftime('%Y-%m-%d') + ".partial.jsonl")
+
+    def load_checkpoint(self, checkpoint_filepath):
+        results = {}
+        if not os.path.exists(checkpoint_filepath):
+            return results
+        with open(checkpoint_filepath, 'r') as file:
+            content = file.read()
+
+        # a run killed mid-write leaves a torn last line, drop it so new entries start on a fresh line
+        if not content.endswith("\n"):
+            content = content[:content.rfind("\n") + 1]
+            with open(checkpoint_filepath, 'w') as file:
+                file.write(content)
+
+        lines = content.splitlines(keepends=True)
+        for line_number, line in enumerate(lines):
+            try:
+                entry = json.loads(line)
+                results[entry['ticker']] = StockData.from_checkpoint(entry, self.date, self.last_close)
+            except (ValueError, KeyError, TypeError) as e:
+                # anything after a bad line is refetched rather than trusted, and the rerun appends after the good ones
+                print(f"Discarding {checkpoint_filepath} from line {line_number + 1}, it is malformed: {e}")
+                with open(checkpoint_filepath, 'w') as file:
+                    file.write("".join(lines[:line_number]))
+                break
+        return results
+
+    def _fetch_stock(self, ticker, date, last_close):
+        for attempt in range(self.retries):
+            with Trace.span('fetch', 'data', ticker=ticker, attempt=attempt):
+                stock_data = StockData(ticker, date=date, last_close=last_close, interpolate=False,
+                                       provider=self.provider, fetch_market_cap=False)
+            if stock_data.error is None:
+                return stock_data
+            if attempt < self.retries - 1:
+                time.sleep(self.backoff * 2 ** attempt)
+        return stock_data
+
+    def interpolate_missing_data(self):
+        full_minutes = Calendar.calendar_for(self.date).session_minutes(self.date)
+        gapped = [stock for stock in self.stock_objects.values() if len(stock.minutes) != len(full_minutes)]
+        if not gapped:
+            return
+
+        filled = interpolate_universe([stock.minutes for stock in gapped], [stock.percents for stock in gapped],
+                                      len(full_minutes))
+        for stock, percents in zip(gapped, filled):
+            stock.minutes = full_minutes[:]
+            stock.percents = percents.tolist()
+
+    def print_failures(self):
+        print(f"Fetched {len(self.stock_objects)} stocks, {len(self.failures)} failed")
+        for ticker, error in sorted(self.failures.items()):
+            print(f"  {ticker}: {error}")
+
     def save_data(self):
         self.stock_objects = dict(
             sorted(self.stock_objects.items(), key=lambda item: item[1].market_cap, reverse=True))
 
-        data = {ticker: stock.to_dict() for ticker, stock in self.stock_objects.items()}
-        data_filename = StockData.get_last_trading_day().strftime('%Y-%m-%d') + ".json"
-        directory = "DailyData"
+        date = self.date.strftime('%Y-%m-%d')
+        snapshot = Snapshot.from_stocks(self.stock_objects, date)
+        directory = self.directory
         os.makedirs(directory, exist_ok=True)
-        data_filepath = os.path.join(directory, data_filename)
+        data_filepath = os.path.join(directory, date + ".snap")
         try:
-            with open(data_filepath, 'w') as file:
-                json.dump(data, file)
-            print(f"Data saved to {data_filename}")
+            snapshot.save(data_filepath)
+            store = RangeStore(directory)
+            store.add(date, date + ".snap", snapshot.tickers)
+            store.update_manifest(date, date + ".snap", Calendar.next_session_close(self.date))
+            self.snapshot_filepath = data_filepath
+            print(f"Data saved to {data_filepath}")
+            if self.export_json:
+                json_filepath = os.path.join(directory, date + ".json")
+                snapshot.save_json(json_filepath)
+                print(f"Data exported to {json_filepath}")
+            return True
         except Exception as e:
             print(f"An error occurred while saving data: {e}")
+            return False
 
     def extract_percents(self):
         percent_arrays = []
@@ -49,14 +200,27 @@ class SP500Data:
         return percent_arrays
 
 class StockData:
-    def __init__(self, ticker):
+    def __init__(self, ticker, date=None, last_close=None, interpolate=True, provider=None, fetch_market_cap=True,
+                 load=True):
         self.ticker = ticker
+        self.interpolate = interpolate
+        self.fetch_market_cap = fetch_market_cap
+        self.provider = provider if provider is not None else Providers.YFinanceProvider()
         self.percents = None
         self.minutes = None
         self.market_cap = None
-        self.date = self.get_last_trading_day()
-        self.last_close = self.get_last_trading_day(previous_day = True)
-        self._load_data()
+        self.error = None
+        self.date = date if date is not None else self.get_last_trading_day()
+        self.last_close = last_close if last_close is not None else self.get_last_trading_day(previous_day = True)
+        if load:
+            self._load_data()
+
+    @classmethod
+    def from_checkpoint(cls, entry, date, last_close):
+        stock_data = cls(entry['ticker'], date=date, last_close=last_close, interpolate=False, load=False)
+        stock_data.minutes = entry['minutes']
+        stock_data.percents = entry['percents']
+        return stock_data
 
     def to_dict(self):
         return {
@@ -67,73 +231,68 @@ class StockData:
 
     def _load_data(self):
         try:
-            stock_object = yf.Ticker(self.ticker)
-            daily_data = stock_object.history(start=self.date.strftime('%Y-%m-%d'), period="1d", interval='1m')
-            previous_close = stock_object.history(start=self.last_close.strftime('%Y-%m-%d'), period="1d")['Close'].iloc[0]
-            self.market_cap = stock_object.info['marketCap']
-            self.percents = [(price - previous_close) / previous_close for price in daily_data['Close']]
-            self.minutes = [timestamp.strftime('%H:%M') for timestamp in daily_data.index]
-
-            if len(self.minutes) != 390:
+            minutes, closes = self.provider.get_minute_bars(self.ticker, self.date)
+            previous_close = self.provider.get_previous_close(self.ticker, self.last_close)
+            if self.fetch_market_cap:
+                self.market_cap = self.provider.get_market_cap(self.ticker)
+            self.percents = [(price - previous_close) / previous_close for price in closes]
+            self.minutes = minutes
+
+            if self.interpolate and len(self.minutes) != Calendar.calendar_for(self.date).session_length(self.date):
                 self.interpolate_missing_data()
 
             print(self.ticker, len(self.minutes))
 
         except Exception as e:
+            self.error = e
             print(f"An error occurred while loading data for {self.ticker}: {e}")
 
     def interpolate_missing_data(self):
-        full_minutes = []
-        start_time = datetime.strptime("09:30", "%H:%M")
-        end_time = datetime.strptime("15:59", "%H:%M")
-        current_time = start_time
-
-        while current_time <= end_time:
-            full_minutes.append(current_time.strftime("%H:%M"))
-            current_time += timedelta(minutes=1)
-
-        original_data = dict(zip(self.minutes, self.percents))
-        interpolated_percents = []
-
-        for minute in full_minutes:
-            if minute in original_data:
-                interpolated_percents.append(original_data[minute])
-            else:
-                earlier_minute = max([m for m in self.minutes if m < minute], default=None)
-                later_minute = min([m for m in self.minutes if m > minute], default=None)
-
-                if earlier_minute and later_minute:
-                    time_diff = (datetime.strptime(later_minute, "%H:%M") - datetime.strptime(earlier_minute,
-                                                                                                 "%H:%M")).total_seconds()
-                    weight = (datetime.strptime(minute, "%H:%M") - datetime.strptime(earlier_minute,
-                                                                                        "%H:%M")).total_seconds() / time_diff
-
-                    interpolated_value = (1 - weight) * original_data[earlier_minute] + weight * original_data[
-                        later_minute]
-                    interpolated_percents.append(interpolated_value)
-                elif earlier_minute:
-                    interpolated_percents.append(original_data[earlier_minute])
-                elif later_minute:
-                    interpolated_percents.append(original_data[later_minute])
-                else:
-                    interpolated_percents.append(0)
-
+        full_minutes = Calendar.calendar_for(self.date).session_minutes(self.date)
+        self.percents = interpolate_universe([self.minutes], [self.percents], len(full_minutes))[0].tolist()
         self.minutes = full_minutes
-        self.percents = interpolated_percents
 
     @staticmethod
     def get_last_trading_day(previous_day=False):
-        present = datetime.now(pytz.timezone('US/Eastern'))
-        nyse = mcal.get_calendar('NYSE')
-        schedule = nyse.schedule(start_date=present - timedelta(days=10), end_date=present)
-
-        last_market_close = schedule['market_close'].iloc[-1]
-        is_after_close = present.date() > last_market_close.date() or (
-                present.date() == last_market_close.date() and present.hour >= 16)
-
-        if previous_day is False:
-            return schedule['market_close'].iloc[-1].date() if is_after_close else schedule['market_close'].iloc[
-                -2].date()
-        else:
-            return schedule['market_close'].iloc[-2].date() if is_after_close else schedule['market_close'].iloc[
-                -3].date()
+        calendar = Calendar.get_calendar()
+        return calendar.previous_session() if previous_day else calendar.last_session()
+
+def minute_offset(minute):
+    hour, minute = minute.split(':')
+    return int(hour) * 60 + int(minute) - MARKET_OPEN
+
+def interpolate_universe(minute_lists, percent_lists, num_minutes=Calendar.REGULAR_SESSION_LENGTH):
+    offset_lists = [[minute_offset(minute) for minute in minutes] for minutes in minute_lists]
+
+    # bars outside the session still act as neighbours for interpolation, so widen the grid to hold them
+    first = min([0] + [min(offsets) for offsets in offset_lists if offsets])
+    last = max([num_minutes - 1] + [max(offsets) for offsets in offset_lists if offsets])
+
+    matrix = np.full((len(offset_lists), last - first + 1), np.nan)
+    for row, (offsets, percents) in enumerate(zip(offset_lists, percent_lists)):
+        matrix[row, np.asarray(offsets, dtype=int) - first] = percents
+
+    return fill_gaps(matrix)[:, -first:num_minutes - first]
+
+def fill_gaps(matrix):
+    num_rows, num_columns = matrix.shape
+    columns = np.arange(num_columns)
+    rows = np.arange(num_rows)[:, None]
+    known = ~np.isnan(matrix)
+
+    earlier = np.maximum.accumulate(np.where(known, columns, -1), axis=1)
+    later = np.minimum.accumulate(np.where(known, columns, num_columns)[:, ::-1], axis=1)[:, ::-1]
+    has_earlier = earlier >= 0
+    has_later = later < num_columns
+
+    earlier_values = matrix[rows, np.clip(earlier, 0, num_columns - 1)]
+    later_values = matrix[rows, np.clip(later, 0, num_columns - 1)]
+
+    # same weighting as a linear interpolation between the surrounding bars
+    span = np.where(has_earlier & has_later & ~known, later - earlier, 1)
+    weight = (columns - earlier) / span
+    interpolated = (1 - weight) * earlier_values + weight * later_values
+
+    filled = np.where(has_earlier, earlier_values, np.where(has_later, later_values, 0.0))
+    filled = np.where(has_earlier & has_later, interpolated, filled)
+    return np.where(known, matrix, filled)
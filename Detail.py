@@ -0,0 +1,115 @@
+import math
+import weakref
+
+import numpy as np
+from Snapshot import Snapshot, DTYPE, column_chunks
+
+ROW_WEIGHTINGS = ('market_cap', 'mean')
+COLUMN_REDUCTIONS = ('last', 'mean')
+
+_snapshot_pyramids = weakref.WeakKeyDictionary()
+
+
+class DetailLevel(Snapshot):
+    # a snapshot whose rows are groups of row_factor stocks and columns buckets of column_factor minutes
+    def __init__(self, tickers, market_caps, minutes, percents, date=None, row_factor=1, column_factor=1):
+        super().__init__(tickers, market_caps, minutes, percents, date)
+        self.row_factor = row_factor
+        self.column_factor = column_factor
+
+
+def reduce_rows(values, weights, factor):
+    if factor == 1:
+        return values, weights
+    starts = np.arange(0, values.shape[0], factor)
+    counts = np.diff(np.append(starts, values.shape[0]))
+    weight_sums = np.add.reduceat(weights, starts)
+    weighted = np.add.reduceat(values * weights[:, None], starts, axis=0)
+    # groups with no market caps at all fall back to a plain mean
+    means = np.add.reduceat(values, starts, axis=0) / counts[:, None]
+    reduced = np.where(weight_sums[:, None] > 0, weighted / np.where(weight_sums > 0, weight_sums, 1)[:, None], means)
+    return reduced, weight_sums
+
+
+def reduce_columns(values, factor, reduction='last'):
+    if factor == 1 and isinstance(values, np.ndarray):
+        return values
+    num_columns = values.shape[1]
+    starts = np.arange(0, num_columns, factor)
+    # the last minute of each bucket, so the final column is still the close
+    ends = np.append(starts[1:], num_columns) - 1
+    reduced = np.zeros((values.shape[0], len(starts)))
+    # one session at a time for a multi-day range, buckets that straddle two sessions add up across both
+    for start, stop in column_chunks(values):
+        chunk = np.asarray(values[:, start:stop], dtype=np.float64)
+        if reduction == 'last':
+            picked = np.flatnonzero((ends >= start) & (ends < stop))
+            reduced[:, picked] = chunk[:, ends[picked] - start]
+        else:
+            buckets = np.arange(start, stop) // factor
+            firsts = np.flatnonzero(np.diff(buckets, prepend=-1))
+            reduced[:, buckets[firsts]] += np.add.reduceat(chunk, firsts, axis=1)
+    if reduction == 'mean':
+        reduced /= np.diff(np.append(starts, num_columns))
+    return reduced
+
+
+class DetailPyramid:
+    def __init__(self, snapshot, row_weighting='market_cap', column_reduction='last'):
+        if row_weighting not in ROW_WEIGHTINGS:
+            raise ValueError(f"Unknown row weighting {row_weighting}, expected one of {', '.join(ROW_WEIGHTINGS)}")
+        if column_reduction not in COLUMN_REDUCTIONS:
+            raise ValueError(f"Unknown column reduction {column_reduction}, "
+                             f"expected one of {', '.join(COLUMN_REDUCTIONS)}")
+        # weak, so the cache keyed on the snapshot doesn't keep it (and every level built from it) alive
+        self._snapshot = weakref.ref(snapshot)
+        self.row_weighting = row_weighting
+        self.column_reduction = column_reduction
+        self.levels = {}
+
+    @property
+    def snapshot(self):
+        return self._snapshot()
+
+    def factors_for(self, max_rows, max_columns):
+        num_rows, num_columns = len(self.snapshot.tickers), len(self.snapshot.minutes)
+        return max(1, math.ceil(num_rows / max_rows)), max(1, math.ceil(num_columns / max_columns))
+
+    def level(self, row_factor, column_factor):
+        key = (row_factor, column_factor)
+        if key not in self.levels:
+            self.levels[key] = self.build_level(row_factor, column_factor)
+        return self.levels[key]
+
+    def build_level(self, row_factor, column_factor):
+        snapshot = self.snapshot
+        if row_factor == 1 and column_factor == 1:
+            return DetailLevel(snapshot.tickers, snapshot.market_caps, snapshot.minutes, snapshot.percents,
+                               snapshot.date)
+
+        market_caps = np.asarray(snapshot.market_caps, dtype=np.float64)
+        if self.row_weighting == 'mean':
+            weights = np.ones(len(market_caps))
+        else:
+            weights = market_caps
+        # columns first, so rows only ever reduce the already narrowed matrix
+        values = reduce_columns(snapshot.percents, column_factor, self.column_reduction)
+        values = np.asarray(values, dtype=np.float64)
+        values, _ = reduce_rows(values, weights, row_factor)
+        group_caps = np.add.reduceat(market_caps, np.arange(0, len(market_caps), row_factor)) \
+            if len(market_caps) else market_caps
+
+        return DetailLevel(snapshot.tickers[::row_factor], group_caps.tolist(), snapshot.minutes[::column_factor],
+                           values.astype(DTYPE), snapshot.date, row_factor, column_factor)
+
+    def fit(self, max_rows, max_columns):
+        return self.level(*self.factors_for(max_rows, max_columns))
+
+
+def get_pyramid(snapshot, row_weighting='market_cap', column_reduction='last'):
+    # one pyramid per snapshot object and weighting, every level it builds stays cached on it
+    pyramids = _snapshot_pyramids.setdefault(snapshot, {})
+    key = (row_weighting, column_reduction)
+    if key not in pyramids:
+        pyramids[key] = DetailPyramid(snapshot, row_weighting, column_reduction)
+    return pyramids[key]
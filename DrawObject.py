@@ -1,7 +1,12 @@
 import math
-import time
+from bisect import bisect_right
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from itertools import accumulate
+import numpy as np
 import pygame
+import Stats
+from Snapshot import column_chunks
 
 
 class DrawObject:
@@ -11,30 +16,47 @@ class DrawObject:
         self.pos = pos if pos is not None else None
         self.color = color if color is not None else None
 
+    def mark_dirty(self, rect):
+        self.view.compositor.add(rect)
+        return rect
+
 class ObjectBorder(DrawObject):
     def __init__(self, view, thickness, color, pos, width, height):
         super().__init__(view, pos, color)
         self.width = width
         self.height = height
         self.thickness = thickness
-        self.draw()
+        self.unzip_steps = None
 
     def draw(self):
         border_rect = []
         border_rect.extend(self.pos)
         border_rect.extend([self.width, self.height])
-        pygame.draw.rect(self.screen, self.color, border_rect, self.thickness)
-        pygame.display.flip()
+        self.mark_dirty(pygame.draw.rect(self.screen, self.color, border_rect, self.thickness))
 
 
     def remove_instant(self):
         border_rect = []
         border_rect.extend(self.pos)
         border_rect.extend([self.width, self.height])
-        pygame.draw.rect(self.screen, (0,0,0), border_rect, self.thickness)
-
-    def remove_unzip(self):
-        self.remove_instant()
+        self.mark_dirty(pygame.draw.rect(self.screen, (0,0,0), border_rect, self.thickness))
+
+    def mark_outline(self):
+        x, y = self.pos
+        self.mark_dirty(pygame.Rect(x, y, self.width + 1, 1))
+        self.mark_dirty(pygame.Rect(x, y + self.height, self.width + 1, 1))
+        self.mark_dirty(pygame.Rect(x, y, 1, self.height + 1))
+        self.mark_dirty(pygame.Rect(x + self.width, y, 1, self.height + 1))
+
+    def remove_unzip(self, progress, previous=None):
+        if self.unzip_steps is None:
+            step_sequence = calculate_steps([self.width, self.height])
+            self.unzip_steps = (list(accumulate(step_sequence[self.width], initial=0)),
+                                list(accumulate(step_sequence[self.height], initial=0)))
+        num_steps = max(self.width, self.height)
+        step_index = min(num_steps, int(progress * num_steps))
+        horizontal_steps = self.unzip_steps[0][step_index]
+        vertical_steps = self.unzip_steps[1][step_index]
 
         # positions
         top_left = self.pos
@@ -42,151 +64,251 @@ class ObjectBorder(DrawObject):
         bottom_left = (self.pos[0], self.pos[1]+self.height)
         bottom_right = (self.pos[0]+self.width, self.pos[1]+self.height)
 
-        step_sequence = calculate_steps([self.width, self.height])
-        vertical_steps, horizontal_steps = 0, 0
-
-        for i in range(max(self.width, self.height)):
-            self.remove_instant()
-            vertical_steps += step_sequence[self.height][i]
-            horizontal_steps += step_sequence[self.width][i]
-
-            # topline
-            pygame.draw.line(self.screen, (0, 0, 0), top_left, top_right, 1)
-            pygame.draw.line(self.screen, self.color, top_left, (top_right[0] - horizontal_steps, top_right[1]), 1)
-            # bottomline
-            pygame.draw.line(self.screen, (0, 0, 0), bottom_left, bottom_right, 1)
-            pygame.draw.line(self.screen, self.color, (bottom_left[0] + horizontal_steps, bottom_left[1]), bottom_right, 1)
-
-            # leftline
-            pygame.draw.line(self.screen, (0, 0, 0), top_left, bottom_left, 1)
-            pygame.draw.line(self.screen, self.color, top_left, (bottom_left[0], bottom_left[1] - vertical_steps), 1)
-            # rightline
-            pygame.draw.line(self.screen, (0, 0, 0), top_right, bottom_right, 1)
-            pygame.draw.line(self.screen, self.color, (top_right[0], top_right[1] + vertical_steps), bottom_right, 1)
-            pygame.display.flip()
-            time.sleep(.001)
-
+        self.remove_instant()
+        # topline
         pygame.draw.line(self.screen, (0, 0, 0), top_left, top_right, 1)
+        pygame.draw.line(self.screen, self.color, top_left, (top_right[0] - horizontal_steps, top_right[1]), 1)
+        # bottomline
         pygame.draw.line(self.screen, (0, 0, 0), bottom_left, bottom_right, 1)
+        pygame.draw.line(self.screen, self.color, (bottom_left[0] + horizontal_steps, bottom_left[1]), bottom_right, 1)
 
+        # leftline
+        pygame.draw.line(self.screen, (0, 0, 0), top_left, bottom_left, 1)
+        pygame.draw.line(self.screen, self.color, top_left, (bottom_left[0], bottom_left[1] - vertical_steps), 1)
+        # rightline
+        pygame.draw.line(self.screen, (0, 0, 0), top_right, bottom_right, 1)
+        pygame.draw.line(self.screen, self.color, (top_right[0], top_right[1] + vertical_steps), bottom_right, 1)
 
-class StockSquare(DrawObject):
-    def __init__(self, view, pos, size, percent):
-        super().__init__(view, pos, get_color(percent))
-        self.size = size
-        self.draw()
+        if step_index == num_steps:
+            pygame.draw.line(self.screen, (0, 0, 0), top_left, top_right, 1)
+            pygame.draw.line(self.screen, (0, 0, 0), bottom_left, bottom_right, 1)
+        self.mark_outline()
 
-    def draw(self):
-        pygame.draw.rect(self.screen, self.color, (self.pos[0], self.pos[1], self.size, self.size))
 
-class StockLine(DrawObject):
-    def __init__(self, view, stock, pos = None, pos2 = None):
+class Heatmap(DrawObject):
+    def __init__(self, view, pos, percents, square_size=1):
         super().__init__(view, pos)
-        self.stock = stock
-        self.squares = []
-        self.percents = []
-        self.pos2 = pos2
-
-    def add_square(self, pos, percent, size):
-        square = StockSquare(self.view, pos, size, percent)
-        self.squares.append(square)
-        self.percents.append(percent)
-        if self.pos is None:
-            self.pos = pos
-        self.pos2 = pos
+        self.square_size = square_size
+        # 8-bit layers of palette indices, recolouring or fading them only ever touches the palettes
+        self.color_scale = view.color_scale
+        self.sort_frame = None
+        self.surface = IndexedLayers(*self.scaled_layers(percents), self.color_scale.palettes)
+
+    def scaled_layers(self, percents):
+        # a session at a time, so a multi-day range only ever has one day's returns in memory
+        layers = (np.empty(percents.shape, dtype=np.uint8), np.empty(percents.shape, dtype=np.uint8))
+        for start, stop in column_chunks(percents):
+            for layer, indices in zip(layers, self.color_scale.layers(percents[:, start:stop])):
+                layer[:, start:stop] = indices
+        if self.square_size != 1:
+            layers = tuple(np.repeat(np.repeat(layer, self.square_size, axis=0), self.square_size, axis=1)
+                           for layer in layers)
+        return layers
+
+    def write_layers(self, x, y, layers):
+        self.surface.write(x, y, layers)
+        area = pygame.Rect(x, y, layers[0].shape[1], layers[0].shape[0])
+        self.mark_dirty(self.surface.blit_to(self.screen, (self.pos[0] + x, self.pos[1] + y), area))
+
+    def draw_column(self, minute_index):
+        x = minute_index * self.square_size
+        area = pygame.Rect(x, 0, self.square_size, self.surface.get_height())
+        self.mark_dirty(self.surface.blit_to(self.screen, (self.pos[0] + x, self.pos[1]), area))
 
     def draw(self):
-        for square in self.squares:
-            square.draw()
-
-    def get_average(self):
-        average = sum(self.percents) / len(self.percents) if self.percents else None
-        return average
-
-    def __len__(self):
-        return len(self.squares)
+        self.mark_dirty(self.surface.blit_to(self.screen, self.pos))
+
+    def set_palettes(self, palettes):
+        self.surface.set_palettes(palettes)
+        if self.sort_frame is not None:
+            self.sort_frame.set_palettes(palettes)
+
+    def recolor(self, color_scale):
+        # every ColorScale shares one index layout, so only the palettes change
+        self.color_scale = color_scale
+        self.set_palettes(color_scale.palettes)
+
+    def fade(self, brightness):
+        self.set_palettes(self.color_scale.faded(brightness))
+
+    def highlight(self, low, high, dim=0.25):
+        self.set_palettes(self.color_scale.highlighted(low, high, dim))
+
+    def update_columns(self, percents, start, stop):
+        # recolour only the columns that changed and put just those on screen
+        self.write_layers(start * self.square_size, 0, self.scaled_layers(percents[:, start:stop]))
+
+    def prepare_sort(self, order):
+        # order[i] is the row that ends up i-th, pixel rows then slide from where they are to their rank
+        positions = np.empty(len(order), dtype=int)
+        positions[np.asarray(order)] = np.arange(len(order))
+        pixel_rows = np.arange(self.surface.get_height())
+        self.sort_offsets = pixel_rows % self.square_size
+        self.sort_starts = pixel_rows - self.sort_offsets
+        self.sort_targets = positions[pixel_rows // self.square_size] * self.square_size
+        self.sort_pixels = self.surface.arrays()
+        empty = np.zeros(self.sort_pixels[0].shape[::-1], dtype=np.uint8)
+        self.sort_frame = IndexedLayers(empty, empty, self.surface.palettes)
+
+    def draw_sort(self, progress, previous=None):
+        eased = progress * progress * (3 - 2 * progress)
+        current = np.rint(self.sort_starts + (self.sort_targets - self.sort_starts) * eased).astype(int)
+        # index 0 is black in both layers, rows passing each other overlap and the later one lands on top
+        frames = []
+        for sort_pixels in self.sort_pixels:
+            pixels = np.zeros_like(sort_pixels)
+            pixels[:, current + self.sort_offsets] = sort_pixels
+            frames.append(pixels.T)
+        self.sort_frame.write(0, 0, frames)
+        self.mark_dirty(self.sort_frame.blit_to(self.screen, self.pos))
+
+    def update_rows(self, percents, rows):
+        for row in rows:
+            self.write_layers(0, row * self.square_size, self.scaled_layers(percents[row:row + 1]))
+
+    def reveal(self, progress, previous=None):
+        num_columns = self.surface.get_width() // self.square_size
+        # one extra step so the last frame shows the closing tick with every column drawn
+        first = 0 if previous is None else min(num_columns, int(previous * (num_columns + 1))) + 1
+        last = min(num_columns - 1, int(progress * (num_columns + 1)))
+        if last < first:
+            return
+        x = first * self.square_size
+        area = pygame.Rect(x, 0, (last - first + 1) * self.square_size, self.surface.get_height())
+        self.mark_dirty(self.surface.blit_to(self.screen, (self.pos[0] + x, self.pos[1]), area))
+
+class BlockGeometry:
+    __slots__ = ('x', 'y', 'end_x', 'num_lines')
+
+    def __init__(self, x, y, end_x, num_lines):
+        self.x = x
+        self.y = y
+        self.end_x = end_x
+        self.num_lines = num_lines
+
+    @property
+    def width(self):
+        return self.end_x - self.x + 1
+
+    @property
+    def last_y(self):
+        return self.y + self.num_lines - 1
 
 class StockBlock(DrawObject):
-    def __init__(self, view, lines=None):
-        super().__init__(view)
-        self.lines = lines if lines is not None else {'stock_lines':{},'block_lines':{}}
+    def __init__(self, view, percents, stocks, geometry, line_surface=None, stats=None, first_row=0):
+        super().__init__(view, (geometry.x, geometry.y))
+        # percents is a (stocks, minutes) view into the snapshot matrix, one row per line
+        self.percents = percents
+        self.stocks = stocks
+        self.geometry = geometry
+        self.line_surface = line_surface
+        # aggregates come from the snapshot's stats, first_row places this block's rows inside them
+        self.stats = stats if stats is not None else Stats.SnapshotStats(percents)
+        self.first_row = first_row
         self.subblocks = []
-
-    def add_line(self, stock_line):
-        self.lines["stock_lines"][stock_line.stock] = stock_line
-
-    def draw_lines(self, speed=None):
-        stock_lines = self.lines['stock_lines'].values()
-        num_minutes = len(list(stock_lines)[0]) - 1
-        for i in range(num_minutes, -1, speed * -1):
-            offset = 0 if num_minutes % speed == i and i != 0 else i
-            for stock_line in stock_lines:
-                color = get_color(stock_line.percents[-1])
-                self.lines['block_lines'][stock_line.stock] = {
-                    "stock": stock_line.stock,
-                    "color": tuple(color),
-                    "start_pos": [stock_line.pos[0] + offset, stock_line.pos2[1]],
-                    "end_pos": list(stock_line.pos2)
-                }
-                pygame.draw.line(self.screen, color, (stock_line.pos[0] + offset, stock_line.pos2[1]), stock_line.pos2, 1)
-            pygame.display.flip()
-            time.sleep(.02)
-
-    def draw_subblocks(self, speed):
-        num_minutes = len(list(self.lines['stock_lines'].values())[0]) - 1
-
-        for i in range(num_minutes, -1, speed * -1):
-            offset = 0 if num_minutes % speed == i and i != 0 else i
-            block_num = 0
-            for subblock in self.subblocks:
-                color = get_color(subblock.average_block())
-                block_lines = subblock.lines['block_lines'].values()
-                for block_line in block_lines:
-                    if block_num % 2 == 0:
-                        pos = (block_line["start_pos"][0] + offset, block_line["start_pos"][1])
-                        pygame.draw.line(self.screen, color, pos, block_line["end_pos"], 1)
-                    else:
-                        end_pos = (block_line["end_pos"][0] - offset, block_line["end_pos"][1])
-                        pygame.draw.line(self.screen, color, block_line["start_pos"], end_pos, 1)
-                block_num += 1
-            pygame.display.flip()
-            time.sleep(.02)
+        self.fill_surface = None
+
+    def get_line_surface(self):
+        if self.line_surface is None:
+            color_scale = self.view.color_scale
+            layers = [np.repeat(indices[:, np.newaxis], self.geometry.width, axis=1)
+                      for indices in color_scale.layers(self.percents[:, -1])]
+            self.line_surface = IndexedLayers(*layers, color_scale.palettes)
+        return self.line_surface
+
+    def blit_lines(self, offset=0, width=None):
+        geometry = self.geometry
+        width = width if width is not None else geometry.width - offset
+        area = pygame.Rect(offset, 0, width, geometry.num_lines)
+        self.mark_dirty(self.get_line_surface().blit_to(self.screen, (geometry.x + offset, geometry.y), area))
+
+    def collapse_offsets(self, speed):
+        num_minutes = self.percents.shape[1] - 1
+        return [0 if num_minutes % speed == i and i != 0 else i for i in range(num_minutes, -1, speed * -1)]
+
+    def collapse_strip(self, speed, progress, previous):
+        offsets = self.collapse_offsets(speed)
+        offset = offsets[min(len(offsets) - 1, int(progress * len(offsets)))]
+        if previous is None:
+            return offset, self.geometry.width - offset
+        previous_offset = offsets[min(len(offsets) - 1, int(previous * len(offsets)))]
+        return offset, previous_offset - offset
+
+    def draw_lines(self, progress, previous=None, speed=7):
+        offset, width = self.collapse_strip(speed, progress, previous)
+        if width > 0:
+            self.blit_lines(offset, width)
+
+    def subblock_palette(self):
+        # one entry per subblock holding its average return's colour
+        palette = [(0, 0, 0)] * 256
+        for block_num, subblock in enumerate(self.subblocks):
+            palette[block_num + 1] = self.view.color_scale.color(subblock.average_block())
+        return palette
+
+    def build_fill_surface(self):
+        # the subblocks where they ended up after the split, each painted with its own palette index
+        rects = [pygame.Rect(subblock.geometry.x, subblock.geometry.y, subblock.geometry.width,
+                             subblock.geometry.num_lines) for subblock in self.subblocks]
+        bounds = rects[0].unionall(rects[1:])
+        surface = pygame.Surface(bounds.size, depth=8)
+        for block_num, subblock in enumerate(self.subblocks):
+            geometry = subblock.geometry
+            surface.fill(block_num + 1, (geometry.x - bounds.x, geometry.y - bounds.y, geometry.width,
+                                         geometry.num_lines))
+        surface.set_palette(self.subblock_palette())
+        return surface, bounds
+
+    def draw_subblocks(self, progress, previous=None, speed=3):
+        if previous is None or self.fill_surface is None:
+            self.fill_surface = self.build_fill_surface()
+        offset, width = self.collapse_strip(speed, progress, previous)
+        if width <= 0:
+            return
+
+        surface, bounds = self.fill_surface
+        for block_num, subblock in enumerate(self.subblocks):
+            geometry = subblock.geometry
+            # even blocks close in from the right edge, odd blocks from the left
+            if block_num % 2 == 0:
+                x = geometry.x + offset
+            else:
+                x = geometry.x + geometry.width - offset - width
+            area = pygame.Rect(x - bounds.x, geometry.y - bounds.y, width, geometry.num_lines)
+            self.mark_dirty(self.screen.blit(surface, (x, geometry.y), area))
+
+    def recolor(self, color_scale):
+        # the lines and the subblock fills are both palette indexed, nothing gets recomputed per pixel
+        if self.line_surface is not None:
+            self.line_surface.set_palettes(color_scale.palettes)
+        for subblock in self.subblocks:
+            subblock.recolor(color_scale)
+        if self.fill_surface is not None:
+            self.fill_surface[0].set_palette(self.subblock_palette())
 
     def draw_border(self, thickness, color):
-        block_lines = list(self.lines['block_lines'].values())
-        pos = [pos-thickness for pos in block_lines[0]['start_pos']]
-        pos2 = [pos+2*thickness for pos in block_lines[-1]['end_pos']]
+        geometry = self.geometry
+        pos = [geometry.x - thickness, geometry.y - thickness]
+        pos2 = [geometry.end_x + 2 * thickness, geometry.last_y + 2 * thickness]
         width = pos2[0] - pos[0]
         height = pos2[1] - pos[1]
-        ObjectBorder(view=self.view, thickness=thickness, color=color, pos=pos, width=width, height=height)
-
-    def shift_block(self, distance):
-        index = 0 if distance > 0 else -1
-        cover_ref_line = list(self.lines["block_lines"].values())[index]
-        width = cover_ref_line["end_pos"][0] - cover_ref_line["start_pos"][0] + 1
-
-        cover_rect = []
-        cover_pos = cover_ref_line["start_pos"] if distance > 0 else [cover_ref_line["start_pos"][0], cover_ref_line["start_pos"][1] - distance-1]
-        cover_rect.extend(cover_pos)
-        cover_rect.extend([width, abs(distance)])
-        pygame.draw.rect(self.screen, (0, 0, 0), cover_rect)
-
-        for block_line in self.lines["block_lines"].values():
-            block_line["start_pos"][1] = block_line["start_pos"][1] + distance
-            block_line["end_pos"][1] = block_line["end_pos"][1] + distance
-            pygame.draw.line(self.screen, block_line["color"], block_line["start_pos"], block_line["end_pos"], 1)
+        border = ObjectBorder(view=self.view, thickness=thickness, color=color, pos=pos, width=width, height=height)
+        border.draw()
+        return border
 
     def split_block(self, num_blocks, separation=0):
         new_blocks = []
-        num_lines = len(self.lines["block_lines"])
+        num_lines = self.geometry.num_lines
         block_size = math.ceil(num_lines / num_blocks)
+        line_surface = self.get_line_surface()
 
         for i in range(0, num_lines, block_size):
-            new_block_lines = {
-                'stock_lines': {k: self.lines['stock_lines'][k] for k in list(self.lines['stock_lines'])[i:i + block_size]},
-                'block_lines': {k: self.lines['block_lines'][k] for k in list(self.lines['block_lines'])[i:i + block_size]}
-            }
-            new_block = StockBlock(self.view, lines=new_block_lines)
+            rows = slice(i, i + block_size)
+            block_lines = len(self.stocks[rows])
+            geometry = BlockGeometry(self.geometry.x, self.geometry.y + i, self.geometry.end_x, block_lines)
+            new_block = StockBlock(self.view, self.percents[rows], self.stocks[rows], geometry,
+                                   line_surface.subsurface((0, i, self.geometry.width, block_lines)),
+                                   self.stats, self.first_row + i)
             new_blocks.append(new_block)
 
         target_y_pos = []
@@ -195,56 +317,126 @@ class StockBlock(DrawObject):
             for i in range(num_blocks):
                 target = (i-middle_index+1)*separation - separation//2
                 target_y_pos.append(target)
+        else:
+            target_y_pos = [0] * len(new_blocks)
 
-        step_sequence = calculate_steps(target_y_pos)
-
-        for step_index in range(max(target_y_pos)):
-            for i in range(num_blocks):
-                step_key = target_y_pos[i]
-                step = step_sequence[step_key][step_index]
-                new_blocks[i].shift_block(step)
-                pygame.display.flip()
-                time.sleep(.003)
-
+        step_sequence = calculate_steps(target_y_pos) if any(target_y_pos) else {0: []}
+        self.split_paths = [(block.geometry.y, list(accumulate(step_sequence[target], initial=0)))
+                            for block, target in zip(new_blocks, target_y_pos)]
         self.subblocks = new_blocks
         return new_blocks
 
-    def average_block(self):
-        stock_lines = list(self.lines['stock_lines'].values())
-        return sum(stock_line.percents[-1] for stock_line in stock_lines) / len(stock_lines)
+    def draw_split(self, progress, previous=None):
+        num_steps = len(self.split_paths[0][1]) - 1
+        step_index = min(num_steps, int(progress * num_steps))
+        low = min(path[-1] for _, path in self.split_paths)
+        high = max(path[-1] for _, path in self.split_paths)
+
+        # clear everything the blocks pass through, then place them at this step
+        geometry = self.geometry
+        cover_rect = (geometry.x, geometry.y + min(0, low), geometry.width,
+                      geometry.num_lines + max(0, high) - min(0, low))
+        self.mark_dirty(self.screen.fill((0, 0, 0), cover_rect))
+        for subblock, (start_y, path) in zip(self.subblocks, self.split_paths):
+            subblock.geometry.y = start_y + path[step_index]
+            subblock.blit_lines()
 
+    def average_block(self):
+        rows = slice(self.first_row, self.first_row + self.geometry.num_lines)
+        return self.stats.mean(rows, -1)
 
     def __str__(self):
         return f"Block(numstocks={len(self)})"
 
     def __len__(self):
-        return len(self.lines["stock_lines"])
+        return len(self.stocks)
 
 class Timeline(DrawObject):
-    def __init__(self, view, start_pos, color):
+    def __init__(self, view, start_pos, color, num_minutes=390, open_time="09:30", minute_step=1, sessions=None):
         super().__init__(view, pos=start_pos)
         self.current_pos = start_pos
         self.color = color
         self.view = view
+        # num_minutes counts pixels, each standing for minute_step minutes
+        self.num_minutes = num_minutes
+        self.minute_step = minute_step
+        self.open_time = datetime.strptime(open_time, "%H:%M")
         self.timeline_parts = {}
-        self.draw(0)
+        self.faded = None
+
+        # a multi-day range gets a tick per session labelled with its day, and the clock runs per session
+        self.sessions = None
+        display_sizes = ["MARKET CLOSE"]
+        if sessions is not None and len(sessions) > 1:
+            self.sessions = [(datetime.strptime(date, "%Y-%m-%d"), datetime.strptime(session_open, "%H:%M"))
+                             for date, session_open, _ in sessions]
+            self.session_starts = list(accumulate((num_minutes for _, _, num_minutes in sessions[:-1]), initial=0))
+            # every session labelled when they're wide enough, otherwise every few so labels don't overlap
+            label_width = get_font('Verdana', 10).size("WED 12/31")[0] + 10
+            narrowest = min(num_minutes for _, _, num_minutes in sessions) / minute_step
+            self.label_every = max(1, math.ceil(label_width / max(narrowest, 1)))
+            display_sizes.append("12/31 12:00 PM")
+
+        clock_font = get_font('Verdana', 24)
+        text_width = max(clock_font.size(text)[0] for text in display_sizes)
+        text_height = clock_font.size("MARKET CLOSE")[1]
+        self.time_rect = pygame.Rect(
+            (self.view.width / 2 - text_width / 2, 100 - text_height / 2),
+            (text_width, text_height)
+        )
+
+    def session_at(self, minute):
+        return max(0, bisect_right(self.session_starts, minute) - 1)
 
     def draw(self, elapsed_time):
+        if self.sessions is not None:
+            self.draw_sessions(elapsed_time)
+            return
         self.current_pos = (self.pos[0] + elapsed_time, self.pos[1])
         self.draw_main_line(thickness=2)
 
-        draw_tickmark_time = False
-        if elapsed_time == 0 or elapsed_time == 390:
+        tickmark_label = None
+        minute = elapsed_time * self.minute_step
+        draw_time = (self.open_time + timedelta(minutes=minute)).strftime("%I:%M %p")
+        if elapsed_time == 0 or elapsed_time == self.num_minutes:
             self.draw_tickmark(tickmark_size=20, thickness=1)
-        elif (elapsed_time + 30) % 60 == 0:
+        elif (minute + 30) // 60 > (minute - self.minute_step + 30) // 60:
+            # the pixel where an hour mark falls, on the half hour offset of a 9:30 open
             self.draw_tickmark(tickmark_size=5, thickness=1)
-            draw_tickmark_time = True
+            tickmark_label = f"{draw_time.split(':')[0].lstrip('0')}{draw_time[-2:]}"
 
-        draw_time = (datetime.strptime("09:30", "%H:%M") + timedelta(minutes=elapsed_time)).strftime("%I:%M %p")
-        self.draw_time(draw_time, draw_tickmark_time)
+        self.draw_time(draw_time.lstrip('0'), tickmark_label, market_close=elapsed_time == self.num_minutes)
+
+    def draw_sessions(self, elapsed_time):
+        self.current_pos = (self.pos[0] + elapsed_time, self.pos[1])
+        self.draw_main_line(thickness=2)
+
+        tickmark_label = None
+        minute = elapsed_time * self.minute_step
+        session = self.session_at(minute)
+        date, session_open = self.sessions[session]
+        if elapsed_time == self.num_minutes:
+            self.draw_tickmark(tickmark_size=20, thickness=1)
+        elif elapsed_time == 0 or session > self.session_at(minute - self.minute_step):
+            # the first pixel of each session
+            self.draw_tickmark(tickmark_size=20 if elapsed_time == 0 else 10, thickness=1)
+            if session % self.label_every == 0:
+                tickmark_label = f"{date.strftime('%a').upper()} {date.month}/{date.day}"
+
+        clock = session_open + timedelta(minutes=minute - self.session_starts[session])
+        draw_time = f"{date.month}/{date.day} {clock.strftime('%I:%M %p').lstrip('0')}"
+        self.draw_time(draw_time, tickmark_label, market_close=elapsed_time == self.num_minutes)
+
+    def reveal(self, progress, previous=None):
+        if previous is None:
+            self.timeline_parts = {}
+        first = 0 if previous is None else min(self.num_minutes, int(previous * (self.num_minutes + 1))) + 1
+        last = min(self.num_minutes, int(progress * (self.num_minutes + 1)))
+        for elapsed_time in range(first, last + 1):
+            self.draw(elapsed_time)
 
     def draw_main_line(self, thickness):
-        pygame.draw.line(self.screen, self.color, self.pos, self.current_pos, thickness)
+        self.mark_dirty(pygame.draw.line(self.screen, self.color, self.pos, self.current_pos, thickness))
         self.timeline_parts["Main Line"] = {
             "line": True,
             "start_pos": self.pos,
@@ -255,7 +447,7 @@ class Timeline(DrawObject):
     def draw_tickmark(self, tickmark_size, thickness):
         pos1 = (self.current_pos[0], self.current_pos[1] - tickmark_size)
         pos2 = (self.current_pos[0], self.current_pos[1] + tickmark_size)
-        pygame.draw.line(self.screen, self.color, pos1, pos2, thickness)
+        self.mark_dirty(pygame.draw.line(self.screen, self.color, pos1, pos2, thickness))
 
         self.timeline_parts["Tickmark " + str(self.current_pos[0])] = {
             "line": True,
@@ -264,60 +456,222 @@ class Timeline(DrawObject):
             "thickness": thickness
         }
 
-    def draw_time(self, draw_time, tickmark_time=False):
-        display_time = "MARKET CLOSE" if draw_time == "04:00 PM" else draw_time.lstrip('0')
+    def draw_time(self, draw_time, tickmark_label=None, market_close=False):
+        display_time = "MARKET CLOSE" if market_close else draw_time
 
         # clear previous time and draw new
-        clock_font = pygame.font.SysFont('Verdana', 24)
-        text_width, text_height = clock_font.size("MARKET CLOSE")
-        time_rect = pygame.Rect(
-            (self.view.width / 2 - text_width / 2, 100 - text_height / 2),
-            (text_width, text_height)
-        )
-        self.screen.fill((0, 0, 0), time_rect)
-        time_text = clock_font.render(display_time, True, (255, 255, 255))
-        self.screen.blit(time_text, time_text.get_rect(center=time_rect.center))
-
-        if tickmark_time:
-            hour = draw_time.split(':')[0].lstrip('0')
-            meridiem = draw_time[-2:]
-            tickmark_time_str = f"{hour}{meridiem}"
-
-            # render and position tickmark time
-            tickmark_font = pygame.font.SysFont('Verdana', 10)
-            tickmark_text = tickmark_font.render(tickmark_time_str, True, self.color)
+        time_rect = self.time_rect
+        self.mark_dirty(self.screen.fill((0, 0, 0), time_rect))
+        time_text = text_cache.render(display_time, ('Verdana', 24), (255, 255, 255))
+        self.mark_dirty(self.screen.blit(time_text, time_text.get_rect(center=time_rect.center)))
+
+        if tickmark_label:
+            # render and position the tickmark's hour or day
+            tickmark_text = text_cache.render(tickmark_label, ('Verdana', 10), self.color)
             tickmark_rect = tickmark_text.get_rect(center=(self.current_pos[0], self.current_pos[1] - 30))
-            self.screen.blit(tickmark_text, tickmark_rect)
+            self.mark_dirty(self.screen.blit(tickmark_text, tickmark_rect))
 
-            self.timeline_parts["Time Label " + tickmark_time_str] = {
+            self.timeline_parts["Time Label " + tickmark_label] = {
                 "line": False,
-                "font": tickmark_font,
-                "string": tickmark_time_str,
+                "text": tickmark_text,
                 "rect": tickmark_rect
             }
 
-    def fade_out(self):
-        while self.color != (0,0,0):
-            color_list = list(self.color)
-            self.color = tuple([max(0, x - 3) for x in color_list])
-            for timeline_part in self.timeline_parts.values():
-                if timeline_part['line']:
-                    pygame.draw.line(self.screen, self.color,
-                                     timeline_part['start_pos'],
-                                     timeline_part['end_pos'],
-                                     timeline_part['thickness'])
-
-                else:
-                    tickmark_rect = timeline_part['rect']
-                    self.screen.fill((0, 0, 0), tickmark_rect)
-                    tickmark_font = timeline_part['font']
-                    tickmark_text = tickmark_font.render(timeline_part['string'], True, self.color)
-                    self.screen.blit(tickmark_text, tickmark_rect)
-                pygame.display.flip()
-
-def get_color(percent):
-    norm = abs(percent) / 0.05 if abs(percent) < 0.05 else 1
-    return (0, int(norm * 255), 0) if percent > 0 else (int(norm * 255), 0, 0)
+    def fade_surface(self):
+        # the drawn timeline as 8-bit coverage, 255 on the lines and the text's antialiasing in between,
+        # so fading it is a new palette and one blit instead of redrawing every part
+        rects = []
+        for timeline_part in self.timeline_parts.values():
+            if timeline_part['line']:
+                (x1, y1), (x2, y2) = timeline_part['start_pos'], timeline_part['end_pos']
+                rect = pygame.Rect(min(x1, x2), min(y1, y2), abs(x2 - x1) + 1, abs(y2 - y1) + 1)
+                rects.append(rect.inflate(2 * timeline_part['thickness'], 2 * timeline_part['thickness']))
+            else:
+                rects.append(timeline_part['rect'])
+        bounds = rects[0].unionall(rects[1:])
+
+        surface = pygame.Surface(bounds.size, depth=8)
+        for timeline_part in self.timeline_parts.values():
+            if timeline_part['line']:
+                start = (timeline_part['start_pos'][0] - bounds.x, timeline_part['start_pos'][1] - bounds.y)
+                end = (timeline_part['end_pos'][0] - bounds.x, timeline_part['end_pos'][1] - bounds.y)
+                pygame.draw.line(surface, 255, start, end, timeline_part['thickness'])
+        pixels = pygame.surfarray.pixels2d(surface)
+        for timeline_part in self.timeline_parts.values():
+            if not timeline_part['line']:
+                rect = timeline_part['rect'].move(-bounds.x, -bounds.y)
+                region = pixels[rect.left:rect.right, rect.top:rect.bottom]
+                np.maximum(region, pygame.surfarray.array_alpha(timeline_part['text']), out=region)
+        del pixels
+        # index 0 is the background around the parts, left as it is on screen
+        surface.set_colorkey(0)
+        return surface, bounds
+
+    def fade_palette(self, fade_step):
+        # shared between timelines, a replayed or re-rendered fade only ever builds each step once
+        key = (tuple(self.color), fade_step)
+        palette = fade_palettes.get(key)
+        if palette is None:
+            brightness = max(0, max(self.color) - 3 * fade_step) / max(self.color)
+            ramp = np.rint(np.outer(np.arange(256) / 255 * brightness, self.color)).astype(int)
+            palette = fade_palettes[key] = [tuple(color) for color in ramp.tolist()]
+        return palette
+
+    def fade_out(self, progress, previous=None):
+        num_steps = math.ceil(max(self.color) / 3)
+        fade_step = min(num_steps, int(progress * num_steps))
+        if previous is None or self.faded is None:
+            self.faded = self.fade_surface()
+        elif fade_step == min(num_steps, int(previous * num_steps)):
+            return
+        surface, bounds = self.faded
+        surface.set_palette(self.fade_palette(fade_step))
+        self.mark_dirty(self.screen.blit(surface, bounds))
+
+class TextCache:
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, string, font, color):
+        key = (string, font, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = get_font(*font).render(string, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.surfaces), 'fonts': len(fonts)}
+
+fonts = {}
+text_cache = TextCache()
+fade_palettes = {}
+
+def get_font(name, size):
+    font = fonts.get((name, size))
+    if font is None:
+        font = fonts[(name, size)] = pygame.font.SysFont(name, size)
+    return font
+
+class ColorScale:
+    # a return maps to an intensity from 0 to 255 that is full at +-clamp, losses and gains each get a
+    # 256 entry palette ramping up from black, so a cell is only ever non-black in one of the two layers
+    def __init__(self, clamp=0.05, negative_color=(255, 0, 0), positive_color=(0, 255, 0), gamma=1.0):
+        self.clamp = clamp
+        self.negative_color = negative_color
+        self.positive_color = positive_color
+        self.gamma = gamma
+        self.palettes = (self.ramp(negative_color), self.ramp(positive_color))
+
+    @staticmethod
+    def ramp(color):
+        return [tuple(round(channel * level / 255) for channel in color) for level in range(256)]
+
+    def intensities(self, percents):
+        magnitude = np.minimum(np.abs(np.asarray(percents, dtype=np.float64)) / self.clamp, 1)
+        if self.gamma != 1:
+            magnitude = magnitude ** self.gamma
+        return (magnitude * 255).astype(np.uint8)
+
+    def layers(self, percents):
+        percents = np.asarray(percents, dtype=np.float64)
+        intensities = self.intensities(percents)
+        gains = percents > 0
+        return np.where(gains, 0, intensities).astype(np.uint8), np.where(gains, intensities, 0).astype(np.uint8)
+
+    def color(self, percent):
+        return self.palettes[1 if percent > 0 else 0][int(self.intensities(percent))]
+
+    def signed_intensity(self, percent):
+        intensity = int(self.intensities(percent))
+        return intensity if percent > 0 else -intensity
+
+    def faded(self, brightness):
+        return tuple([tuple(color) for color in (np.array(palette) * brightness).astype(int).tolist()]
+                     for palette in self.palettes)
+
+    def highlighted(self, low, high, dim=0.25):
+        # colours for returns outside [low, high] dimmed, the band itself left as it is
+        low, high = self.signed_intensity(low), self.signed_intensity(high)
+        return tuple([color if low <= sign * level <= high else tuple(int(channel * dim) for channel in color)
+                      for level, color in enumerate(palette)]
+                     for sign, palette in zip((-1, 1), self.palettes))
+
+COLOR_SCALES = {
+    'default': ColorScale(),
+    'wide': ColorScale(clamp=0.10),
+    'blue_orange': ColorScale(negative_color=(255, 140, 0), positive_color=(0, 140, 255)),
+}
+
+
+def get_color_scale(color_scale):
+    if not isinstance(color_scale, str):
+        return color_scale
+    if color_scale not in COLOR_SCALES:
+        raise ValueError(f"Unknown color scale {color_scale}, expected one of {', '.join(COLOR_SCALES)}")
+    return COLOR_SCALES[color_scale]
+
+
+def indexed_surface(indices, palette):
+    # indices are (rows, columns), surfarray wants (x, y)
+    indices = np.asarray(indices, dtype=np.uint8)
+    surface = pygame.Surface((indices.shape[1], indices.shape[0]), depth=8)
+    surface.set_palette(palette)
+    pygame.surfarray.blit_array(surface, indices.T)
+    return surface
+
+
+class IndexedLayers:
+    # losses and gains as two 8-bit surfaces, the gains blitted additively over the losses
+    def __init__(self, negative, positive, palettes):
+        self.layers = (indexed_surface(negative, palettes[0]), indexed_surface(positive, palettes[1]))
+        self.palettes = palettes
+
+    @classmethod
+    def from_surfaces(cls, layers, palettes):
+        indexed_layers = cls.__new__(cls)
+        indexed_layers.layers = layers
+        indexed_layers.palettes = palettes
+        return indexed_layers
+
+    def get_width(self):
+        return self.layers[0].get_width()
+
+    def get_height(self):
+        return self.layers[0].get_height()
+
+    def set_palettes(self, palettes):
+        self.palettes = palettes
+        for layer, palette in zip(self.layers, palettes):
+            layer.set_palette(palette)
+
+    def subsurface(self, rect):
+        return IndexedLayers.from_surfaces(tuple(layer.subsurface(rect) for layer in self.layers), self.palettes)
+
+    def arrays(self):
+        return tuple(pygame.surfarray.array2d(layer) for layer in self.layers)
+
+    def write(self, x, y, indices):
+        # straight into the surfaces, blitting another 8-bit surface would remap through whatever palette is set
+        for layer, layer_indices in zip(self.layers, indices):
+            height, width = layer_indices.shape
+            pygame.surfarray.pixels2d(layer)[x:x + width, y:y + height] = layer_indices.T
+
+    def blit_to(self, screen, pos, area=None):
+        rect = screen.blit(self.layers[0], pos, area)
+        screen.blit(self.layers[1], pos, area, special_flags=pygame.BLEND_ADD)
+        return rect
+
 
 def calculate_steps(distances, step_size=1):
     result = {}
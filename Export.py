@@ -0,0 +1,120 @@
+import argparse
+import contextlib
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+# the pygame banner would otherwise land in the --pipe frame stream
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+import pygame
+import DrawObject
+import Layout
+import View
+
+_canvas = None
+
+
+def _init_canvas(data_filepath, width, height, layout='market_cap', sort_by_close=False, color_scale='default'):
+    global _canvas
+    # keep stdout clean for the frame stream
+    with contextlib.redirect_stdout(sys.stderr):
+        _canvas = View.Canvas(width=width, height=height, data_filepath=data_filepath, headless=True, layout=layout,
+                              sort_by_close=sort_by_close, color_scale=color_scale)
+
+
+def _render_chunk(chunk):
+    start, stop, fps, output_directory = chunk
+    frames = []
+    for frame_index, frame in _canvas.render_frames(fps, start, stop):
+        if output_directory is None:
+            frames.append(pygame.image.tobytes(frame, 'RGB'))
+        else:
+            pygame.image.save(frame, os.path.join(output_directory, f"frame_{frame_index:05d}.png"))
+    return frames
+
+
+def export_frames(data_filepath, width, height, fps, output_directory=None, pipe=None, workers=1, chunk_size=30,
+                  layout='market_cap', sort_by_close=False, color_scale='default'):
+    _init_canvas(data_filepath, width, height, layout, sort_by_close, color_scale)
+    num_frames = _canvas.count_frames(fps)
+    if output_directory is not None:
+        os.makedirs(output_directory, exist_ok=True)
+
+    # every frame is a function of its index, so contiguous ranges can render anywhere and stitch in order
+    chunks = [(start, min(start + chunk_size, num_frames), fps, output_directory)
+              for start in range(0, num_frames, chunk_size)]
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=_init_canvas,
+                                    initargs=(data_filepath, width, height, layout, sort_by_close, color_scale))
+        results = pool.imap(_render_chunk, chunks)
+    else:
+        pool = None
+        results = map(_render_chunk, chunks)
+
+    try:
+        for frames in results:
+            if pipe is not None:
+                for frame in frames:
+                    pipe.write(frame)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return num_frames
+
+
+def benchmark_workers(data_filepath, width, height, fps, worker_counts):
+    results = {}
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as output_directory:
+            start = time.perf_counter()
+            num_frames = export_frames(data_filepath, width, height, fps, output_directory, workers=workers)
+            results[workers] = time.perf_counter() - start
+            print(f"{workers} workers: {num_frames} frames in {results[workers]:.2f}s "
+                  f"({num_frames / results[workers]:.1f} fps, {results[worker_counts[0]] / results[workers]:.2f}x)",
+                  file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the recap animation offscreen.")
+    parser.add_argument('data_filepath', help="snapshot to render (.snap or .json)")
+    parser.add_argument('--width', type=int, default=540)
+    parser.add_argument('--height', type=int, default=960)
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--output', default='Frames', help="directory for numbered PNG frames")
+    parser.add_argument('--pipe', action='store_true', help="write raw RGB24 frames to stdout instead of PNGs")
+    parser.add_argument('--workers', type=int, default=1, help="render frame ranges in this many processes")
+    parser.add_argument('--layout', choices=Layout.LAYOUTS, default='market_cap',
+                        help="row order: by market cap, or grouped by how closely intraday moves correlate")
+    parser.add_argument('--sort-by-close', action='store_true',
+                        help="slide the heatmap rows into closing order before the unzip")
+    parser.add_argument('--color-scale', choices=list(DrawObject.COLOR_SCALES), default='default',
+                        help="palette the returns are drawn with")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="time PNG export with 1 worker up to --workers and report the speedup")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        # powers of two up to --workers, plus --workers itself
+        worker_counts = sorted({2 ** i for i in range(args.workers.bit_length())} | {args.workers})
+        benchmark_workers(args.data_filepath, args.width, args.height, args.fps, worker_counts)
+    elif args.pipe:
+        num_frames = export_frames(args.data_filepath, args.width, args.height, args.fps, pipe=sys.stdout.buffer,
+                                   workers=args.workers, layout=args.layout, sort_by_close=args.sort_by_close,
+                                   color_scale=args.color_scale)
+        print(f"Wrote {num_frames} {args.width}x{args.height} frames to stdout", file=sys.stderr)
+    else:
+        num_frames = export_frames(args.data_filepath, args.width, args.height, args.fps, args.output,
+                                   workers=args.workers, layout=args.layout, sort_by_close=args.sort_by_close,
+                                   color_scale=args.color_scale)
+        print(f"Wrote {num_frames} frames to {args.output}")
+
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
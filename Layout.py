@@ -0,0 +1,77 @@
+import copy
+import math
+import weakref
+
+import numpy as np
+from Detail import reduce_columns
+
+LAYOUTS = ('market_cap', 'correlation')
+# a session's worth of minutes, a multi-day range is bucketed down to about this many before correlating
+MAX_COLUMNS = 390
+
+_snapshot_orders = weakref.WeakKeyDictionary()
+
+
+def correlation_order(percents, num_components=16, leaf_size=8, max_columns=MAX_COLUMNS):
+    # reduced a session at a time, so a range's matrix is never read into memory whole
+    factor = max(1, math.ceil(percents.shape[1] / max_columns))
+    percents = np.asarray(reduce_columns(percents, factor), dtype=np.float64)
+    num_rows = percents.shape[0]
+    if num_rows <= leaf_size or percents.shape[1] < 3:
+        return np.arange(num_rows)
+
+    # minute to minute moves, centred and scaled so a dot product between rows is their correlation
+    paths = np.diff(percents, axis=1)
+    paths -= paths.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(paths, axis=1, keepdims=True)
+    paths = np.divide(paths, norms, out=np.zeros_like(paths), where=norms > 0)
+
+    # the strongest shared directions come from the small minutes x minutes matrix, never a stocks x stocks one
+    values, vectors = np.linalg.eigh(paths.T @ paths)
+    top = np.argsort(values)[::-1][:num_components]
+    points = paths @ vectors[:, top]
+
+    # divisive clustering: split each group at the median of its main axis, leaves come out in tree order
+    order = []
+    groups = [np.arange(num_rows)]
+    while groups:
+        rows = groups.pop()
+        if len(rows) <= leaf_size:
+            order.extend(rows.tolist())
+            continue
+        centered = points[rows] - points[rows].mean(axis=0)
+        axis = np.linalg.svd(centered, full_matrices=False)[2][0]
+        if axis[np.argmax(np.abs(axis))] < 0:
+            axis = -axis
+        ranked = rows[np.argsort(centered @ axis, kind='stable')]
+        half = len(ranked) // 2
+        groups.append(ranked[half:])
+        groups.append(ranked[:half])
+    return np.array(order)
+
+
+def get_order(snapshot, layout='market_cap'):
+    if layout == 'market_cap':
+        return np.arange(len(snapshot))
+    if layout != 'correlation':
+        raise ValueError(f"Unknown layout {layout}, expected one of {', '.join(LAYOUTS)}")
+    order = _snapshot_orders.get(snapshot)
+    if order is None:
+        order = correlation_order(snapshot.percents)
+        _snapshot_orders[snapshot] = order
+    return order
+
+
+def apply_layout(snapshot, layout='market_cap'):
+    if layout == 'market_cap':
+        return snapshot
+    order = get_order(snapshot, layout)
+    # a copy keeps whatever else the snapshot carries, a range's sessions and lazy matrix included
+    reordered = copy.copy(snapshot)
+    reordered.tickers = [snapshot.tickers[row] for row in order]
+    reordered.market_caps = [snapshot.market_caps[row] for row in order]
+    if hasattr(snapshot.percents, 'take_rows'):
+        reordered.percents = snapshot.percents.take_rows(order)
+    else:
+        reordered.percents = np.asarray(snapshot.percents)[order]
+    return reordered
@@ -0,0 +1,218 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import Calendar
+import Providers
+from MarketCaps import MarketCapStore
+from Snapshot import Snapshot, DTYPE
+import View
+
+
+class WallClock:
+    def now(self):
+        return datetime.now(Calendar.EASTERN)
+
+
+class SimulatedClock:
+    # market time that runs speed times faster than the wall clock, advance() jumps it forward
+    def __init__(self, start, speed=1.0):
+        self.start = start
+        self.speed = speed
+        self.offset = timedelta(0)
+        self.started = time.monotonic()
+
+    def now(self):
+        return self.start + self.offset + timedelta(seconds=(time.monotonic() - self.started) * self.speed)
+
+    def advance(self, minutes):
+        self.offset += timedelta(minutes=minutes)
+
+
+class LivePoller(threading.Thread):
+    def __init__(self, provider, tickers, date, last_close, minutes, updates, clock=None, interval=15.0,
+                 max_workers=8):
+        super().__init__(daemon=True)
+        self.provider = provider
+        self.tickers = list(tickers)
+        self.date = date
+        self.last_close = last_close
+        self.minutes = list(minutes)
+        self.minute_index = {minute: index for index, minute in enumerate(self.minutes)}
+        open_hour, open_minute = map(int, self.minutes[0].split(':'))
+        self.open_minute = open_hour * 60 + open_minute
+        self.updates = updates
+        self.clock = clock if clock is not None else WallClock()
+        self.interval = interval
+        self.max_workers = max_workers
+        self.previous_closes = [None] * len(self.tickers)
+        self.last_minutes = [None] * len(self.tickers)
+        self.stop_event = threading.Event()
+
+    def frontier(self):
+        # columns before this index belong to minutes that have already closed
+        present = self.clock.now()
+        if present.date() != self.date:
+            return len(self.minutes) if present.date() > self.date else 0
+        elapsed = present.hour * 60 + present.minute - self.open_minute
+        return max(0, min(len(self.minutes), elapsed))
+
+    def poll_ticker(self, row):
+        ticker = self.tickers[row]
+        try:
+            if self.previous_closes[row] is None:
+                self.previous_closes[row] = self.provider.get_previous_close(ticker, self.last_close)
+            return self.provider.get_minute_bars_since(ticker, self.date, self.last_minutes[row])
+        except Exception as e:
+            print(f"Polling {ticker} failed, retrying next poll: {e}")
+            return [], []
+
+    def poll(self, executor=None):
+        frontier = self.frontier()
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(self.poll_ticker, range(len(self.tickers))))
+        else:
+            results = list(executor.map(self.poll_ticker, range(len(self.tickers))))
+
+        bars = {}
+        for row, (minutes, closes) in enumerate(results):
+            previous_close = self.previous_closes[row]
+            # a bar for the current minute is still forming, it comes back on a later poll
+            kept = [(minute, close) for minute, close in zip(minutes, closes)
+                    if minute in self.minute_index and self.minute_index[minute] < frontier]
+            if not kept or previous_close is None:
+                continue
+            self.last_minutes[row] = kept[-1][0]
+            bars[row] = (np.array([self.minute_index[minute] for minute, _ in kept]),
+                         np.array([(close - previous_close) / previous_close for _, close in kept]))
+        self.updates.put((bars, frontier))
+        return frontier
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not self.stop_event.is_set():
+                if self.poll(executor) >= len(self.minutes):
+                    break
+                self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class LiveSession:
+    # owns the returns matrix on the drawing side, the poller only ever talks to it through the queue
+    def __init__(self, tickers, market_caps, minutes, date, updates):
+        self.updates = updates
+        self.percents = np.zeros((len(tickers), len(minutes)), dtype=DTYPE)
+        self.received = np.zeros(self.percents.shape, dtype=bool)
+        self.num_filled = 0
+        self.snapshot = Snapshot(tickers, market_caps, minutes, self.percents, date.strftime('%Y-%m-%d'))
+
+    def drain(self):
+        start = None
+        while True:
+            try:
+                bars, frontier = self.updates.get_nowait()
+            except queue.Empty:
+                break
+            for row, (indices, percents) in bars.items():
+                self.percents[row, indices] = percents
+                self.received[row, indices] = True
+                start = int(indices[0]) if start is None else min(start, int(indices[0]))
+            if frontier > self.num_filled:
+                start = self.num_filled if start is None else min(start, self.num_filled)
+                self.num_filled = frontier
+
+        if start is None:
+            return None
+        # minutes with no bar yet hold the last known return until one shows up
+        for column in range(start, self.num_filled):
+            missing = ~self.received[:, column]
+            self.percents[missing, column] = self.percents[missing, column - 1] if column > 0 else 0
+        return start, self.num_filled
+
+    def complete(self):
+        return self.num_filled >= self.percents.shape[1]
+
+
+def load_market_caps(provider, tickers, store=None, max_workers=8):
+    if store is not None:
+        stale_tickers = store.stale_tickers(tickers)
+        if stale_tickers:
+            store.refresh(stale_tickers, provider, max_workers)
+        return [store.get(ticker, 0) for ticker in tickers]
+
+    def market_cap(ticker):
+        try:
+            return provider.get_market_cap(ticker)
+        except Exception:
+            return 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(market_cap, tickers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the session heatmap growing minute by minute.")
+    parser.add_argument('--date', help="session to replay, YYYY-MM-DD, defaults to today")
+    parser.add_argument('--replay', help="replay recorded responses from this directory on a simulated clock")
+    parser.add_argument('--synthetic', action='store_true', help="replay generated bars on a simulated clock")
+    parser.add_argument('--start', help="simulated clock start, HH:MM, defaults to the open")
+    parser.add_argument('--speed', type=float, default=60.0, help="simulated seconds per real second")
+    parser.add_argument('--interval', type=float, default=15.0, help="seconds between polls")
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    simulated = args.replay is not None or args.synthetic
+    if args.date is not None:
+        date = datetime.strptime(args.date, '%Y-%m-%d').date()
+    else:
+        date = datetime.now(Calendar.EASTERN).date()
+    calendar = Calendar.calendar_for(date)
+    if date not in calendar.session_index:
+        print(f"{date} is not a trading session")
+        return
+    minutes = calendar.session_minutes(date)
+    last_close = Calendar.session_before(date)
+
+    if simulated:
+        start_time = args.start if args.start is not None else minutes[0]
+        start_hour, start_minute = map(int, start_time.split(':'))
+        clock = SimulatedClock(Calendar.EASTERN.localize(datetime(date.year, date.month, date.day,
+                                                                  start_hour, start_minute)), args.speed)
+        source = Providers.ReplayProvider(args.replay) if args.replay else Providers.SyntheticProvider()
+        provider = Providers.ClockedProvider(source, clock)
+        store = None
+    else:
+        clock = WallClock()
+        provider = Providers.YFinanceProvider()
+        store = MarketCapStore(os.path.join('DailyData', 'market_caps.json'))
+
+    if args.synthetic:
+        tickers = provider.provider.tickers
+    else:
+        with open('spx.txt', 'r') as file:
+            tickers = [line.strip() for line in file if line.strip()]
+
+    market_caps = load_market_caps(provider, tickers, store, args.workers)
+    order = sorted(range(len(tickers)), key=lambda row: market_caps[row], reverse=True)
+    tickers = [tickers[row] for row in order]
+    market_caps = [market_caps[row] for row in order]
+
+    updates = queue.Queue()
+    session = LiveSession(tickers, market_caps, minutes, date, updates)
+    poller = LivePoller(provider, tickers, date, last_close, minutes, updates, clock, args.interval, args.workers)
+
+    # new bars are drawn straight into full size heatmap columns
+    canvas = View.Canvas(snapshot=session.snapshot, level_of_detail=False)
+    canvas.run_live(session, poller)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+
+class MarketCapStore:
+    def __init__(self, filepath=os.path.join('DailyData', 'market_caps.json'), max_age=timedelta(days=7)):
+        self.filepath = filepath
+        self.max_age = max_age
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.filepath):
+            return
+        try:
+            with open(self.filepath, 'r') as file:
+                self.entries = json.load(file)
+        except ValueError as e:
+            print(f"Ignoring unreadable market cap store {self.filepath}: {e}")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.filepath) or '.', exist_ok=True)
+        with self.lock:
+            data = dict(self.entries)
+        temp_filepath = self.filepath + '.tmp'
+        with open(temp_filepath, 'w') as file:
+            json.dump(data, file)
+        os.replace(temp_filepath, self.filepath)
+
+    def get(self, ticker, default=None):
+        with self.lock:
+            entry = self.entries.get(ticker)
+        return entry['market_cap'] if entry is not None else default
+
+    def stale_tickers(self, tickers, today=None):
+        today = today if today is not None else date.today()
+        stale = []
+        with self.lock:
+            for ticker in tickers:
+                entry = self.entries.get(ticker)
+                if entry is None or today - datetime.strptime(entry['updated'], '%Y-%m-%d').date() >= self.max_age:
+                    stale.append(ticker)
+        return stale
+
+    def refresh(self, tickers, provider, max_workers=8):
+        failures = {}
+        today = date.today().strftime('%Y-%m-%d')
+
+        def fetch(ticker):
+            try:
+                return ticker, provider.get_market_cap(ticker), None
+            except Exception as e:
+                return ticker, None, e
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for ticker, market_cap, error in executor.map(fetch, tickers):
+                # on failure keep whatever value we already had
+                if error is not None or market_cap is None:
+                    failures[ticker] = error
+                    continue
+                with self.lock:
+                    self.entries[ticker] = {'market_cap': market_cap, 'updated': today}
+
+        self.save()
+        if failures:
+            print(f"Market cap refresh failed for {len(failures)} tickers, keeping last known values")
+        return failures
+
+    def refresh_in_background(self, tickers, provider, max_workers=8):
+        thread = threading.Thread(target=self.refresh, args=(tickers, provider, max_workers), daemon=True)
+        thread.start()
+        return thread
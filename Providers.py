@@ -0,0 +1,160 @@
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+import yfinance as yf
+from Calendar import EASTERN
+
+
+class MarketDataProvider:
+    def get_minute_bars(self, ticker, date):
+        # returns (minutes, closes) for the session, minutes as 'HH:MM' strings
+        raise NotImplementedError
+
+    def get_previous_close(self, ticker, date):
+        # returns the closing price of the session on date
+        raise NotImplementedError
+
+    def get_market_cap(self, ticker):
+        raise NotImplementedError
+
+    def get_minute_bars_since(self, ticker, date, since=None):
+        # bars after the 'HH:MM' minute since, fetched as a whole day here and filtered
+        minutes, closes = self.get_minute_bars(ticker, date)
+        if since is None:
+            return minutes, closes
+        kept = [(minute, close) for minute, close in zip(minutes, closes) if minute > since]
+        return [minute for minute, _ in kept], [close for _, close in kept]
+
+
+class YFinanceProvider(MarketDataProvider):
+    def get_minute_bars(self, ticker, date):
+        daily_data = yf.Ticker(ticker).history(start=date.strftime('%Y-%m-%d'), period="1d", interval='1m')
+        minutes = [timestamp.strftime('%H:%M') for timestamp in daily_data.index]
+        return minutes, [float(price) for price in daily_data['Close']]
+
+    def get_previous_close(self, ticker, date):
+        return float(yf.Ticker(ticker).history(start=date.strftime('%Y-%m-%d'), period="1d")['Close'].iloc[0])
+
+    def get_minute_bars_since(self, ticker, date, since=None):
+        if since is None:
+            return self.get_minute_bars(ticker, date)
+        hour, minute = map(int, since.split(':'))
+        start = EASTERN.localize(datetime(date.year, date.month, date.day, hour, minute)) + timedelta(minutes=1)
+        daily_data = yf.Ticker(ticker).history(start=start, end=start + timedelta(days=1), interval='1m')
+        daily_data = daily_data[daily_data.index >= start]
+        minutes = [timestamp.strftime('%H:%M') for timestamp in daily_data.index]
+        return minutes, [float(price) for price in daily_data['Close']]
+
+    def get_market_cap(self, ticker):
+        return yf.Ticker(ticker).info['marketCap']
+
+
+class RecordingProvider(MarketDataProvider):
+    def __init__(self, provider, cache_directory='MarketDataCache'):
+        self.provider = provider
+        self.cache_directory = cache_directory
+
+    def get_minute_bars(self, ticker, date):
+        minutes, closes = self.provider.get_minute_bars(ticker, date)
+        self._record(response_path(self.cache_directory, 'bars', ticker, date), {'minutes': minutes, 'closes': closes})
+        return minutes, closes
+
+    def get_previous_close(self, ticker, date):
+        close = self.provider.get_previous_close(ticker, date)
+        self._record(response_path(self.cache_directory, 'close', ticker, date), {'close': close})
+        return close
+
+    def get_market_cap(self, ticker):
+        market_cap = self.provider.get_market_cap(ticker)
+        self._record(response_path(self.cache_directory, 'market_cap', ticker), {'market_cap': market_cap})
+        return market_cap
+
+    def _record(self, filepath, response):
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        temp_filepath = filepath + '.tmp'
+        with open(temp_filepath, 'w') as file:
+            json.dump(response, file)
+        os.replace(temp_filepath, filepath)
+
+
+class ReplayProvider(MarketDataProvider):
+    def __init__(self, cache_directory='MarketDataCache'):
+        self.cache_directory = cache_directory
+
+    def get_minute_bars(self, ticker, date):
+        response = self._replay(response_path(self.cache_directory, 'bars', ticker, date))
+        return response['minutes'], response['closes']
+
+    def get_previous_close(self, ticker, date):
+        return self._replay(response_path(self.cache_directory, 'close', ticker, date))['close']
+
+    def get_market_cap(self, ticker):
+        return self._replay(response_path(self.cache_directory, 'market_cap', ticker))['market_cap']
+
+    def _replay(self, filepath):
+        if not os.path.exists(filepath):
+            raise LookupError(f"No recorded response at {filepath}")
+        with open(filepath, 'r') as file:
+            return json.load(file)
+
+
+class ClockedProvider(MarketDataProvider):
+    # replays another provider as if the session were in progress at clock.now()
+    def __init__(self, provider, clock):
+        self.provider = provider
+        self.clock = clock
+
+    def get_minute_bars(self, ticker, date):
+        present = self.clock.now()
+        if date > present.date():
+            return [], []
+        minutes, closes = self.provider.get_minute_bars(ticker, date)
+        if date == present.date():
+            current = present.strftime('%H:%M')
+            kept = [(minute, close) for minute, close in zip(minutes, closes) if minute <= current]
+            minutes, closes = [minute for minute, _ in kept], [close for _, close in kept]
+        return minutes, closes
+
+    def get_previous_close(self, ticker, date):
+        return self.provider.get_previous_close(ticker, date)
+
+    def get_market_cap(self, ticker):
+        return self.provider.get_market_cap(ticker)
+
+
+class SyntheticProvider(MarketDataProvider):
+    def __init__(self, num_tickers=500, num_minutes=390, seed=0, gap_fraction=0.0, open_time="09:30"):
+        self.tickers = [f"SYN{i:04d}" for i in range(num_tickers)]
+        self.num_minutes = num_minutes
+        self.seed = seed
+        self.gap_fraction = gap_fraction
+        open_hour, open_minute = map(int, open_time.split(':'))
+        self.open_minute = open_hour * 60 + open_minute
+
+    def _rng(self, ticker, date, kind):
+        # crc32 rather than hash() so runs are reproducible across processes
+        return np.random.default_rng([self.seed, zlib.crc32(f"{kind}:{ticker}:{date}".encode())])
+
+    def get_minute_bars(self, ticker, date):
+        rng = self._rng(ticker, date, 'bars')
+        start = self.get_previous_close(ticker, date)
+        closes = start * np.exp(np.cumsum(rng.normal(0, 0.001, self.num_minutes)))
+        kept = rng.random(self.num_minutes) >= self.gap_fraction
+        minutes = [f"{(self.open_minute + i) // 60:02d}:{(self.open_minute + i) % 60:02d}"
+                   for i in range(self.num_minutes)]
+        return [minute for minute, keep in zip(minutes, kept) if keep], closes[kept].tolist()
+
+    def get_previous_close(self, ticker, date):
+        return float(self._rng(ticker, None, 'close').uniform(10, 500))
+
+    def get_market_cap(self, ticker):
+        return int(self._rng(ticker, None, 'market_cap').integers(10 ** 9, 3 * 10 ** 12))
+
+
+def response_path(cache_directory, kind, ticker, date=None):
+    if date is None:
+        return os.path.join(cache_directory, kind, f"{ticker}.json")
+    return os.path.join(cache_directory, kind, date.strftime('%Y-%m-%d'), f"{ticker}.json")
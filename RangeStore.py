@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+
+import numpy as np
+from Snapshot import Snapshot
+
+INDEX_FILENAME = 'index.json'
+MANIFEST_FILENAME = 'manifest.json'
+
+_index_lock = threading.Lock()
+
+
+class RangeStore:
+    def __init__(self, directory='DailyData'):
+        self.directory = directory
+        self.index_filepath = os.path.join(directory, INDEX_FILENAME)
+
+    def read_index(self):
+        if not os.path.exists(self.index_filepath):
+            return {'sessions': {}, 'tickers': {}}
+        with open(self.index_filepath, 'r') as file:
+            return json.load(file)
+
+    def add(self, date, filename, tickers):
+        with _index_lock:
+            index = self.read_index()
+            index['sessions'][date] = {'file': filename, 'num_tickers': len(tickers)}
+            for ticker in tickers:
+                dates = index['tickers'].setdefault(ticker, [])
+                if date not in dates:
+                    dates.append(date)
+                    dates.sort()
+
+            temp_filepath = self.index_filepath + '.tmp'
+            with open(temp_filepath, 'w') as file:
+                json.dump(index, file)
+            os.replace(temp_filepath, self.index_filepath)
+
+    def update_manifest(self, date, filename, valid_until=None):
+        # a few fields naming the newest snapshot, small enough to read before anything heavy is imported
+        with _index_lock:
+            manifest = read_manifest(self.directory)
+            if manifest is not None and manifest['date'] > date:
+                return
+            manifest = {'date': date, 'file': filename,
+                        'valid_until': valid_until.isoformat() if valid_until is not None else None}
+            manifest_filepath = os.path.join(self.directory, MANIFEST_FILENAME)
+            temp_filepath = manifest_filepath + '.tmp'
+            with open(temp_filepath, 'w') as file:
+                json.dump(manifest, file)
+            os.replace(temp_filepath, manifest_filepath)
+
+    def sessions(self, start_date=None, end_date=None):
+        dates = sorted(self.read_index()['sessions'])
+        return [date for date in dates
+                if (start_date is None or date >= start_date) and (end_date is None or date <= end_date)]
+
+    def ticker_sessions(self, ticker):
+        return self.read_index()['tickers'].get(ticker, [])
+
+    def session_path(self, date):
+        return os.path.join(self.directory, self.read_index()['sessions'][date]['file'])
+
+    def latest(self):
+        sessions = self.sessions()
+        return sessions[-1] if sessions else None
+
+    def load_range(self, start_date, end_date):
+        sessions = self.sessions(start_date, end_date)
+        if not sessions:
+            raise LookupError(f"No sessions stored between {start_date} and {end_date}")
+        return RangeSnapshot([Snapshot.load(self.session_path(date)) for date in sessions])
+
+
+def read_manifest(directory='DailyData'):
+    manifest_filepath = os.path.join(directory, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_filepath):
+        return None
+    try:
+        with open(manifest_filepath, 'r') as file:
+            return json.load(file)
+    except ValueError as e:
+        print(f"Ignoring unreadable manifest {manifest_filepath}: {e}")
+        return None
+
+
+class RangeSnapshot:
+    def __init__(self, days):
+        self.days = days
+        latest = days[-1]
+
+        # rows follow the latest session's market cap order, tickers it lacks go last
+        self.tickers = list(latest.tickers)
+        self.market_caps = list(latest.market_caps)
+        known = set(self.tickers)
+        for day in reversed(days[:-1]):
+            for ticker, market_cap in zip(day.tickers, day.market_caps):
+                if ticker not in known:
+                    known.add(ticker)
+                    self.tickers.append(ticker)
+                    self.market_caps.append(market_cap)
+
+        self.minutes = [minute for day in days for minute in day.minutes]
+        self.sessions = [(day.date, len(day.minutes)) for day in days]
+        self.date = f"{days[0].date}_{days[-1].date}"
+        self.percents = RangeMatrix(days, self.tickers)
+
+    def __len__(self):
+        return len(self.tickers)
+
+
+class RangeMatrix:
+    # returns since the close before the first session, read from each day's memmap only when asked for
+    def __init__(self, days, tickers):
+        self.days = days
+        self.dtype = np.dtype('<f4')
+        self.shape = (len(tickers), sum(len(day.minutes) for day in days))
+        self.column_starts = np.cumsum([0] + [len(day.minutes) for day in days])
+
+        row_lookup = {ticker: row for row, ticker in enumerate(tickers)}
+        self.day_rows = []
+        for day in days:
+            rows = np.full(len(tickers), -1)
+            rows[[row_lookup[ticker] for ticker in day.tickers]] = np.arange(len(day.tickers))
+            self.day_rows.append(rows)
+
+        # growth factor carried into each day, only the closing column of earlier days is read
+        self.day_bases = []
+        base = np.ones(len(tickers))
+        for day, rows in zip(days, self.day_rows):
+            self.day_bases.append(base)
+            closes = self.day_columns(day, rows, slice(len(day.minutes) - 1, len(day.minutes)))[:, 0]
+            base = base * (1 + closes)
+
+    def take_rows(self, rows):
+        # the same lazy matrix over a subset of rows, for blocks and sorted copies of a range
+        matrix = RangeMatrix.__new__(RangeMatrix)
+        matrix.days = self.days
+        matrix.dtype = self.dtype
+        matrix.column_starts = self.column_starts
+        matrix.day_rows = [day_rows[rows] for day_rows in self.day_rows]
+        matrix.day_bases = [day_base[rows] for day_base in self.day_bases]
+        matrix.shape = (len(matrix.day_bases[0]) if self.days else 0, self.shape[1])
+        return matrix
+
+    def day_columns(self, day, rows, columns):
+        present = rows >= 0
+        values = np.zeros((len(rows), len(range(*columns.indices(len(day.minutes))))))
+        if len(day.minutes):
+            values[present] = day.percents[rows[present], columns]
+        return values
+
+    def columns(self, start, stop):
+        pieces = []
+        for day_index, day in enumerate(self.days):
+            day_start, day_stop = self.column_starts[day_index], self.column_starts[day_index + 1]
+            if day_stop <= start or day_start >= stop:
+                continue
+            local = slice(max(start, day_start) - day_start, min(stop, day_stop) - day_start)
+            day_values = self.day_columns(day, self.day_rows[day_index], local)
+            pieces.append(self.day_bases[day_index][:, None] * (1 + day_values) - 1)
+        if not pieces:
+            return np.zeros((self.shape[0], 0), dtype=self.dtype)
+        return np.concatenate(pieces, axis=1).astype(self.dtype)
+
+    def __getitem__(self, key):
+        if not isinstance(key, (tuple, int, np.integer)):
+            return self.take_rows(key)
+        rows, columns = key if isinstance(key, tuple) else (key, slice(None))
+        if isinstance(columns, slice):
+            start, stop, step = columns.indices(self.shape[1])
+            return self.columns(start, stop)[rows, ::step] if step != 1 else self.columns(start, stop)[rows]
+        column = columns + self.shape[1] if columns < 0 else columns
+        return self.columns(column, column + 1)[rows, 0]
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.columns(0, self.shape[1])
+        return values if dtype is None else values.astype(dtype)
+
+    def __len__(self):
+        return self.shape[0]
@@ -0,0 +1,134 @@
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b'SPXSNAP1'
+ALIGNMENT = 64
+DTYPE = '<f4'
+
+
+class Snapshot:
+    def __init__(self, tickers, market_caps, minutes, percents, date=None):
+        self.tickers = list(tickers)
+        self.market_caps = list(market_caps)
+        self.minutes = list(minutes)
+        self.percents = percents
+        self.date = date
+
+    @classmethod
+    def from_stocks(cls, stock_objects, date=None):
+        stocks = list(stock_objects.values())
+        minutes = stocks[0].minutes if stocks else []
+        percents = np.zeros((len(stocks), len(minutes)), dtype=DTYPE)
+        for row, stock in enumerate(stocks):
+            percents[row, :len(stock.percents)] = stock.percents[:len(minutes)]
+        return cls(stock_objects.keys(), [stock.market_cap for stock in stocks], minutes, percents, date)
+
+    @classmethod
+    def from_dict(cls, data, date=None):
+        tickers = list(data.keys())
+        minutes = data[tickers[0]]['minutes'] if tickers else []
+        percents = np.zeros((len(tickers), len(minutes)), dtype=DTYPE)
+        for row, ticker in enumerate(tickers):
+            # short rows were drawn as 0% by the old per-ticker json loader
+            row_percents = data[ticker]['percents'][:len(minutes)]
+            percents[row, :len(row_percents)] = row_percents
+        return cls(tickers, [data[ticker]['market_cap'] for ticker in tickers], minutes, percents, date)
+
+    def to_dict(self):
+        return {
+            ticker: {
+                'percents': self.percents[row].tolist(),
+                'minutes': self.minutes,
+                'market_cap': self.market_caps[row]
+            }
+            for row, ticker in enumerate(self.tickers)
+        }
+
+    def save(self, filepath):
+        header = json.dumps({
+            'date': self.date,
+            'tickers': self.tickers,
+            'market_caps': self.market_caps,
+            'minutes': self.minutes,
+            'shape': [len(self.tickers), len(self.minutes)],
+            'dtype': DTYPE
+        }).encode('utf-8')
+        offset = len(MAGIC) + 4 + len(header)
+        header += b' ' * (-offset % ALIGNMENT)
+
+        # write next to the target and swap it in so readers never see a half written file
+        temp_filepath = filepath + '.tmp'
+        with open(temp_filepath, 'wb') as file:
+            file.write(MAGIC)
+            file.write(struct.pack('<I', len(header)))
+            file.write(header)
+            file.write(np.ascontiguousarray(self.percents, dtype=DTYPE).tobytes())
+        os.replace(temp_filepath, filepath)
+
+    def save_json(self, filepath):
+        with open(filepath, 'w') as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def load(cls, filepath):
+        if filepath.endswith('.json'):
+            return cls.load_json(filepath)
+
+        with open(filepath, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{filepath} is not a snapshot file")
+            header_length = struct.unpack('<I', file.read(4))[0]
+            header = json.loads(file.read(header_length))
+
+        shape = tuple(header['shape'])
+        offset = len(MAGIC) + 4 + header_length
+        if shape[0] * shape[1] == 0:
+            percents = np.zeros(shape, dtype=header['dtype'])
+        else:
+            percents = np.memmap(filepath, dtype=header['dtype'], mode='r', offset=offset, shape=shape)
+        return cls(header['tickers'], header['market_caps'], header['minutes'], percents, header['date'])
+
+    @classmethod
+    def load_json(cls, filepath):
+        with open(filepath, 'r') as file:
+            data = json.load(file)
+        date = os.path.splitext(os.path.basename(filepath))[0]
+        return cls.from_dict(data, date)
+
+    def __len__(self):
+        return len(self.tickers)
+
+
+def column_chunks(percents):
+    # (start, stop) column ranges to read a matrix in: one session each for a multi-day range, else all at once
+    column_starts = getattr(percents, 'column_starts', None)
+    if column_starts is None:
+        return [(0, percents.shape[1])]
+    return [(int(start), int(stop)) for start, stop in zip(column_starts[:-1], column_starts[1:]) if stop > start]
+
+def snapshot_path(json_filepath):
+    return os.path.splitext(json_filepath)[0] + '.snap'
+
+def convert_json(json_filepath):
+    snap_filepath = snapshot_path(json_filepath)
+    Snapshot.load_json(json_filepath).save(snap_filepath)
+    print(f"Converted {json_filepath} to {snap_filepath}")
+    return snap_filepath
+
+def convert_directory(directory='DailyData'):
+    for filename in sorted(os.listdir(directory)):
+        # calendar, market cap and index files share the directory, only dated files are snapshots
+        if filename.endswith('.json') and filename[:4].isdigit():
+            convert_json(os.path.join(directory, filename))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            convert_json(path)
+    else:
+        convert_directory()
@@ -0,0 +1,80 @@
+import weakref
+
+import numpy as np
+from Snapshot import column_chunks
+
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90)
+
+_snapshot_stats = weakref.WeakKeyDictionary()
+
+
+class SnapshotStats:
+    def __init__(self, percents, market_caps=None):
+        self.percents = percents
+        if not hasattr(percents, 'shape'):
+            percents = np.asarray(percents, dtype=np.float64)
+        self.shape = percents.shape
+
+        if market_caps is None or not np.any(market_caps):
+            weights = np.ones(self.shape[0])
+        else:
+            weights = np.asarray(market_caps, dtype=np.float64)
+        self.weights = weights / weights.sum() if self.shape[0] else weights
+
+        # prefix[i, j] holds the sum of percents[:i, :j], so any rectangle is four lookups
+        self.prefix = np.zeros((self.shape[0] + 1, self.shape[1] + 1))
+        self.index_returns = np.zeros(self.shape[1])
+        self.advancers = np.zeros(self.shape[1], dtype=int)
+        self.decliners = np.zeros(self.shape[1], dtype=int)
+        # a session at a time, so a multi-day range is never read whole
+        for start, stop in column_chunks(percents):
+            chunk = np.asarray(percents[:, start:stop], dtype=np.float64)
+            self.prefix[1:, start + 1:stop + 1] = chunk.cumsum(axis=0).cumsum(axis=1) + self.prefix[1:, start, None]
+            if self.shape[0]:
+                self.index_returns[start:stop] = self.weights @ chunk
+            self.advancers[start:stop] = (chunk > 0).sum(axis=0)
+            self.decliners[start:stop] = (chunk < 0).sum(axis=0)
+        self.breadth = self.advancers - self.decliners
+        self.bands = {}
+
+    def bounds(self, key, length):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(length)
+            if step != 1:
+                raise ValueError("Stats ranges must be contiguous")
+            return start, max(start, stop)
+        index = key + length if key < 0 else key
+        return index, index + 1
+
+    def total(self, rows=slice(None), minutes=slice(None)):
+        row_start, row_stop = self.bounds(rows, self.shape[0])
+        minute_start, minute_stop = self.bounds(minutes, self.shape[1])
+        prefix = self.prefix
+        return float(prefix[row_stop, minute_stop] - prefix[row_start, minute_stop]
+                     - prefix[row_stop, minute_start] + prefix[row_start, minute_start])
+
+    def mean(self, rows=slice(None), minutes=slice(None)):
+        row_start, row_stop = self.bounds(rows, self.shape[0])
+        minute_start, minute_stop = self.bounds(minutes, self.shape[1])
+        count = (row_stop - row_start) * (minute_stop - minute_start)
+        return self.total(rows, minutes) / count if count else 0.0
+
+    def percentile_bands(self, percentiles=DEFAULT_PERCENTILES):
+        percentiles = tuple(percentiles)
+        if percentiles not in self.bands:
+            values = np.zeros((len(percentiles), self.shape[1]))
+            if self.shape[0]:
+                for start, stop in column_chunks(self.percents):
+                    values[:, start:stop] = np.percentile(np.asarray(self.percents[:, start:stop], dtype=np.float64),
+                                                          percentiles, axis=0)
+            self.bands[percentiles] = dict(zip(percentiles, values))
+        return self.bands[percentiles]
+
+
+def get_stats(snapshot):
+    # computed once per snapshot object and shared by everything that draws from it
+    stats = _snapshot_stats.get(snapshot)
+    if stats is None:
+        stats = SnapshotStats(snapshot.percents, snapshot.market_caps)
+        _snapshot_stats[snapshot] = stats
+    return stats
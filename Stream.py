@@ -0,0 +1,75 @@
+import os
+import queue
+import threading
+
+import numpy as np
+import Calendar
+import Data
+from MarketCaps import MarketCapStore
+from Snapshot import Snapshot, DTYPE
+
+
+class SnapshotFetcher(threading.Thread):
+    # runs the full ingest on its own thread, a None on the stream marks the end
+    def __init__(self, stream, **kwargs):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.kwargs = kwargs
+        self.data = None
+
+    def run(self):
+        try:
+            self.data = Data.SP500Data(stream=self.stream, **self.kwargs)
+        finally:
+            self.stream.put(None)
+
+    def snapshot_filepath(self):
+        return self.data.snapshot_filepath if self.data is not None else None
+
+
+class StreamingSession:
+    def __init__(self, tickers, market_caps, minutes, date, stream):
+        self.stream = stream
+        self.num_minutes = len(minutes)
+        self.finished = False
+
+        # rows go where the last known market caps put them, the saved snapshot settles the final order
+        order = sorted(range(len(tickers)), key=lambda row: market_caps[row], reverse=True)
+        tickers = [tickers[row] for row in order]
+        market_caps = [market_caps[row] for row in order]
+        self.rows = {ticker: row for row, ticker in enumerate(tickers)}
+        self.percents = np.zeros((len(tickers), len(minutes)), dtype=DTYPE)
+        self.snapshot = Snapshot(tickers, market_caps, minutes, self.percents, date.strftime('%Y-%m-%d'))
+
+    def drain(self):
+        rows = []
+        while not self.finished:
+            try:
+                item = self.stream.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.finished = True
+                break
+            ticker, minutes, percents = item
+            row = self.rows.get(ticker)
+            if row is None:
+                continue
+            self.percents[row] = Data.interpolate_universe([minutes], [percents], self.num_minutes)[0]
+            rows.append(row)
+        return rows
+
+
+def start_session(tickers=None, date=None, directory='DailyData', **kwargs):
+    if tickers is None:
+        with open('spx.txt', 'r') as file:
+            tickers = [line.strip() for line in file if line.strip()]
+    if date is None:
+        date = Data.StockData.get_last_trading_day()
+
+    market_caps = MarketCapStore(os.path.join(directory, 'market_caps.json'))
+    minutes = Calendar.calendar_for(date).session_minutes(date)
+    stream = queue.Queue()
+    session = StreamingSession(tickers, [market_caps.get(ticker, 0) for ticker in tickers], minutes, date, stream)
+    fetcher = SnapshotFetcher(stream, tickers=tickers, date=date, directory=directory, **kwargs)
+    return session, fetcher
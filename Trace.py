@@ -0,0 +1,192 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+# SPX_TRACE=<path> turns tracing on for a whole run and writes a Chrome trace there on exit,
+# SPX_TRACE_FORMAT=json writes the plain summary instead
+TRACE_ENV = 'SPX_TRACE'
+FORMAT_ENV = 'SPX_TRACE_FORMAT'
+
+enabled = False
+_events = []
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+
+class FrameStats:
+    def __init__(self, target_fps=60, bucket_ms=2, max_ms=100):
+        self.target_fps = target_fps
+        self.bucket_ms = bucket_ms
+        self.max_ms = max_ms
+        self.reset()
+
+    def reset(self):
+        self.buckets = [0] * (self.max_ms // self.bucket_ms + 1)
+        self.num_frames = 0
+        self.dropped_frames = 0
+        self.total_seconds = 0.0
+        self.worst_seconds = 0.0
+
+    def record(self, seconds, target_fps=None):
+        # loops tick at different rates, each frame is judged against the rate of the loop that drew it
+        if target_fps is not None:
+            self.target_fps = target_fps
+        milliseconds = seconds * 1000
+        self.buckets[min(len(self.buckets) - 1, int(milliseconds // self.bucket_ms))] += 1
+        self.num_frames += 1
+        self.total_seconds += seconds
+        self.worst_seconds = max(self.worst_seconds, seconds)
+        # every whole frame budget past the first is a refresh that showed the previous frame again
+        budget = 1 / self.target_fps
+        if seconds > budget * 1.5:
+            self.dropped_frames += round(seconds / budget) - 1
+
+    def to_dict(self):
+        histogram = {}
+        for index, count in enumerate(self.buckets):
+            if count:
+                low = index * self.bucket_ms
+                label = f"{low}-{low + self.bucket_ms}ms" if index < len(self.buckets) - 1 else f"{low}ms+"
+                histogram[label] = count
+        return {
+            'target_fps': self.target_fps,
+            'frames': self.num_frames,
+            'dropped_frames': self.dropped_frames,
+            'mean_ms': self.total_seconds / self.num_frames * 1000 if self.num_frames else 0.0,
+            'worst_ms': self.worst_seconds * 1000,
+            'histogram': histogram
+        }
+
+
+frames = FrameStats()
+
+
+class Span:
+    __slots__ = ('name', 'category', 'args', 'start')
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, self.category, self.start, time.perf_counter() - self.start, **self.args)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def span(name, category='default', **args):
+    # when tracing is off this hands back one shared object that does nothing
+    if not enabled:
+        return _null_span
+    return Span(name, category, args)
+
+
+def now():
+    return time.perf_counter()
+
+
+def record(name, category, start, duration, **args):
+    # for spans that open and close in different calls, start comes from now()
+    if not enabled:
+        return
+    with _lock:
+        _events.append((name, category, start, duration, threading.get_ident(), args))
+
+
+def record_frame(seconds, target_fps=60):
+    if enabled:
+        frames.record(seconds, target_fps)
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    with _lock:
+        del _events[:]
+    frames.reset()
+
+
+def summary():
+    with _lock:
+        events = list(_events)
+    spans = {}
+    scenes = {}
+    for name, category, _, duration, _, args in events:
+        add_duration(spans, f"{category}:{name}", duration)
+        # the work each scene's animations did, next to the scene spans' wall time, replays
+        # from a seek are redrawing earlier frames and stay out of it
+        if category == 'animation' and args.get('scene') is not None and not args.get('replay'):
+            add_duration(scenes, args['scene'], duration)
+    for stats in list(spans.values()) + list(scenes.values()):
+        stats['mean_ms'] = stats['total_ms'] / stats['count']
+    return {'spans': spans, 'scenes': scenes, 'frames': frames.to_dict()}
+
+
+def add_duration(totals, key, duration):
+    stats = totals.setdefault(key, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+    stats['count'] += 1
+    stats['total_ms'] += duration * 1000
+    stats['max_ms'] = max(stats['max_ms'], duration * 1000)
+
+
+def chrome_trace():
+    with _lock:
+        events = list(_events)
+    pid = os.getpid()
+    trace_events = [{
+        'name': name,
+        'cat': category,
+        'ph': 'X',
+        'ts': (start - _origin) * 1e6,
+        'dur': duration * 1e6,
+        'pid': pid,
+        'tid': thread_id,
+        'args': args
+    } for name, category, start, duration, thread_id, args in events]
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms', 'otherData': {'frames': frames.to_dict()}}
+
+
+def save(filepath, trace_format='chrome'):
+    data = chrome_trace() if trace_format == 'chrome' else summary()
+    with open(filepath, 'w') as file:
+        json.dump(data, file, default=str)
+    print(f"Trace written to {filepath}")
+
+
+def _save_on_exit(filepath, trace_format):
+    try:
+        save(filepath, trace_format)
+    except OSError as e:
+        print(f"An error occurred while writing the trace: {e}")
+
+
+if os.environ.get(TRACE_ENV):
+    enable()
+    atexit.register(_save_on_exit, os.environ[TRACE_ENV], os.environ.get(FORMAT_ENV, 'chrome'))
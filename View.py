@@ -1,29 +1,86 @@
+import functools
+from itertools import accumulate
+import math
 import sys
 import os
-import time
 
+import numpy as np
 import pygame
-import json
+import Animation
+import Detail
 import DrawObject
+import Layout
+import Stats
+import Trace
+from Snapshot import Snapshot
+from RangeStore import RangeStore
+
+
+class Compositor:
+    def __init__(self, screen, max_rects=64, display=True):
+        self.screen = screen
+        self.max_rects = max_rects
+        self.display = display
+        self.dirty_rects = []
+
+    def add(self, rect):
+        if rect is not None and rect.width > 0 and rect.height > 0:
+            self.dirty_rects.append(pygame.Rect(rect))
+
+    def add_all(self):
+        self.dirty_rects = [self.screen.get_rect()]
+
+    def present(self):
+        if not self.dirty_rects or not self.display:
+            self.dirty_rects = []
+            return
+        # past a point one bounding rect is cheaper than many small copies
+        if len(self.dirty_rects) > self.max_rects:
+            self.dirty_rects = [self.dirty_rects[0].unionall(self.dirty_rects[1:])]
+        pygame.display.update(self.dirty_rects)
+        self.dirty_rects = []
 
 
 class Canvas:
-    def __init__(self, width=540, height=960, data_filepath=None):
+    def __init__(self, width=540, height=960, data_filepath=None, headless=False, date_range=None,
+                 directory='DailyData', snapshot=None, layout='market_cap', sort_by_close=False,
+                 level_of_detail=True, color_scale='default'):
+        if headless:
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
         pygame.init()
         pygame.display.set_caption('S&P 500 Recap')
         self.width = width
         self.height = height
-        self.screen = pygame.display.set_mode((self.width, self.height))
+        self.headless = headless
+        self.layout = layout
+        self.sort_by_close = sort_by_close
+        self.level_of_detail = level_of_detail
+        self.color_scale = DrawObject.get_color_scale(color_scale)
+        if headless:
+            self.screen = pygame.Surface((self.width, self.height))
+        else:
+            self.screen = pygame.display.set_mode((self.width, self.height))
+        self.compositor = Compositor(self.screen, display=not headless)
         self.clock = pygame.time.Clock()
-        self.font = pygame.font.SysFont('Lucida Console', 24)
-        self.scene = 1
+        self.font = DrawObject.get_font('Lucida Console', 24)
         self.draw_objects = {}
 
-        if data_filepath is not None:
+        if snapshot is not None:
+            self.data_filepath = None
+            self.snapshot = snapshot
+        elif date_range is not None:
+            # a multi-day range reads each session's snapshot through the index as columns are asked for
+            self.data_filepath = None
+            try:
+                self.snapshot = RangeStore(directory).load_range(*date_range)
+            except LookupError as e:
+                print(e)
+                sys.exit()
+            print(f"Data loaded for {len(self.snapshot.sessions)} sessions from {directory}")
+        elif data_filepath is not None:
             self.data_filepath = data_filepath
             if os.path.exists(self.data_filepath):
-                with open(self.data_filepath, 'r') as json_file:
-                    self.data = json.load(json_file)
+                self.snapshot = Snapshot.load(self.data_filepath)
                 print(f"Data loaded from {self.data_filepath}")
             else:
                 print(f"File {self.data_filepath} does not exist.")
@@ -32,20 +89,41 @@ class Canvas:
             print("No data filepath entered.")
             sys.exit()
 
-        self.stocks = list(self.data.keys())
+        self.load_snapshot(self.snapshot)
 
-    def draw(self):
-        if self.scene == 1:
-            self.screen.fill((0, 0, 0))
-            self.draw_scene_1()
-        elif self.scene ==2:
-            self.draw_scene_2()
-        pygame.display.flip()
+    def load_snapshot(self, snapshot):
+        # (date, open, minutes) per session of a multi-day range, for the timeline's day ticks
+        sessions = getattr(snapshot, 'sessions', None)
+        self.sessions = None
+        if sessions is not None:
+            starts = accumulate((num_minutes for _, num_minutes in sessions), initial=0)
+            self.sessions = [(date, snapshot.minutes[start], num_minutes)
+                             for (date, num_minutes), start in zip(sessions, starts)]
+        snapshot = Layout.apply_layout(snapshot, self.layout)
+        if self.level_of_detail:
+            # room for the timeline above and the split blocks' spacing, wider universes and ranges get aggregated
+            snapshot = Detail.get_pyramid(snapshot).fit(self.height - 400, self.width - 80)
+        self.snapshot = snapshot
+        self.stocks = snapshot.tickers
+        self.draw_objects = {}
+        with Trace.span('build_scenes', 'view', tickers=len(self.stocks)):
+            scenes = [('scene 1', self.build_scene_1()), ('scene 2', self.build_scene_2())]
+        for scene, animations in scenes:
+            for animation in animations:
+                animation.scene = scene
+        self.scheduler = Animation.Scheduler([animation for _, animations in scenes for animation in animations])
+
+    def clear(self):
+        self.screen.fill((0, 0, 0))
+        self.compositor.add_all()
 
-    def draw_scene_1(self):
+    def build_scene_1(self):
         square_size = 1
-        minutes = self.data[self.stocks[0]]['minutes'][:]
-        minutes.append("16:00")
+        minutes = self.snapshot.minutes[:]
+        # closing tick, 16:00 on a regular session
+        last_hour, last_minute = map(int, minutes[-1].split(':'))
+        close_hour, close_minute = divmod(last_hour * 60 + last_minute + 1, 60)
+        minutes.append(f"{close_hour:02d}:{close_minute:02d}")
         num_minutes = len(minutes)
         num_stocks = len(self.stocks)
 
@@ -54,81 +132,178 @@ class Canvas:
 
         main_border = DrawObject.ObjectBorder(self, thickness=1, color=(255,255,255), pos=(start_x-2, start_y-2),
                                               width=num_minutes+3, height=num_stocks+3)
-        main_stock_block = DrawObject.StockBlock(self)
-        timeline = DrawObject.Timeline(self, (start_x, start_y - 50), (255, 255, 255))
+        timeline = DrawObject.Timeline(self, (start_x, start_y - 50), (255, 255, 255),
+                                       num_minutes=num_minutes - 1, open_time=minutes[0],
+                                       minute_step=getattr(self.snapshot, 'column_factor', 1),
+                                       sessions=self.sessions)
+        self.draw_objects["Main Border"] = main_border
         self.draw_objects["Timeline"] = timeline
 
-        for minute_index in range(num_minutes):
-            timeline.draw(minute_index)
-            if minute_index < len(minutes) - 1:
-                for stock_index in range(num_stocks):
-                    stock = self.stocks[stock_index]
-                    try:
-                        percent = self.data[stock]['percents'][minute_index]
-                    except IndexError as e:
-                        print(f"IndexError: {e}")
-                        print(f"Stock: {stock}, x: {minute_index}, y: {stock_index}")
-                        percent = 0
-
-                    if minute_index == 0:
-                        stock_line = DrawObject.StockLine(self, stock)
-                        self.draw_objects["Main Stock Block"] = main_stock_block
-                        main_stock_block.add_line(stock_line)
-
-                    stock_line = main_stock_block.lines['stock_lines'][stock]
-                    stock_line.add_square((start_x + minute_index * square_size, start_y + stock_index * square_size),
-                                          percent, square_size)
-            pygame.display.flip()
-            self.clock.tick(60)
-        time.sleep(1.5)
-        main_border.remove_unzip()
-        self.scene = 2
-
-    def draw_scene_2(self):
+        heatmap = DrawObject.Heatmap(self, (start_x, start_y), self.snapshot.percents, square_size)
+        self.draw_objects["Heatmap"] = heatmap
+        block_geometry = DrawObject.BlockGeometry(start_x, start_y, start_x + (num_minutes - 2) * square_size,
+                                                  num_stocks)
+        percents, stocks, stats = self.snapshot.percents, self.stocks, Stats.get_stats(self.snapshot)
+        if self.sort_by_close:
+            # ranked once, best close on top, and the blocks after the sort keep that order
+            order = np.argsort(-np.asarray(percents[:, -1]), kind='stable')
+            heatmap.prepare_sort(order)
+            percents = percents[order]
+            stocks = [stocks[row] for row in order]
+            stats = Stats.SnapshotStats(percents, [self.snapshot.market_caps[row] for row in order])
+        self.draw_objects["Main Stock Block"] = DrawObject.StockBlock(self, percents, stocks, block_geometry,
+                                                                      stats=stats)
+
+        # one minute per frame at 60 fps
+        reveal_duration = num_minutes / 60
+        scene = [
+            Animation.Call(self.clear),
+            Animation.Call(main_border.draw),
+            Animation.Parallel([
+                Animation.Tween(timeline.reveal, reveal_duration),
+                Animation.Tween(heatmap.reveal, reveal_duration)
+            ]),
+            Animation.Pause(1.5)
+        ]
+        if self.sort_by_close:
+            scene += [
+                Animation.Tween(heatmap.draw_sort, 1.5),
+                Animation.Pause(1.0)
+            ]
+        scene.append(Animation.Tween(main_border.remove_unzip, 1.0))
+        return scene
+
+    def build_scene_2(self):
         stock_block = self.draw_objects["Main Stock Block"]
         timeline = self.draw_objects['Timeline']
-        timeline.fade_out()
+        subblocks = stock_block.split_block(num_blocks=4, separation=40)
+
+        scene = [
+            Animation.Tween(timeline.fade_out, 1.4),
+            Animation.Tween(functools.partial(stock_block.draw_lines, speed=7), 1.1),
+            Animation.Pause(1.5),
+            Animation.Tween(stock_block.draw_split, 1.0)
+        ]
+        for subblock in subblocks:
+            scene.append(Animation.Call(functools.partial(subblock.draw_border, 1, (255,255,255))))
+            scene.append(Animation.Pause(.4))
+        scene.append(Animation.Tween(functools.partial(stock_block.draw_subblocks, speed=3), 2.6))
+        return scene
+
+    def replay_frame(self):
+        # palettes only apply to the next blit, so the current frame is drawn again with them
+        if self.scheduler.elapsed > 0:
+            self.scheduler.seek(self.scheduler.elapsed)
+
+    def set_color_scale(self, color_scale):
+        self.color_scale = DrawObject.get_color_scale(color_scale)
+        self.draw_objects["Heatmap"].recolor(self.color_scale)
+        self.draw_objects["Main Stock Block"].recolor(self.color_scale)
+        self.replay_frame()
 
-        stock_block.draw_lines(speed=7)
-        time.sleep(1.5)
-        stock_block.split_block(num_blocks=4, separation=40)
-        for subblock in stock_block.subblocks:
-            subblock.draw_border(1, (255,255,255))
-            time.sleep(.4)
-        stock_block.draw_subblocks(speed=3)
+    def highlight_returns(self, low, high, dim=0.25):
+        # heatmap cells outside [low, high] dimmed, clear_highlight puts the full scale back
+        self.draw_objects["Heatmap"].highlight(low, high, dim)
+        self.replay_frame()
 
-        self.scene = 3
+    def clear_highlight(self):
+        self.draw_objects["Heatmap"].recolor(self.color_scale)
+        self.replay_frame()
 
-    def redraw_sorted_lines(self, square_size):
-        sorted_lines = sorted(self.draw_objects.values(), key=lambda sl: sl.percents[-1], reverse=True)
+    def fade_heatmap(self, brightness):
+        self.draw_objects["Heatmap"].fade(brightness)
+        self.replay_frame()
 
-        middle_index = len(sorted_lines) // 2
-        start_y = (self.height - (len(sorted_lines) * square_size)) / 2
+    def count_frames(self, fps):
+        return math.ceil(self.scheduler.duration * fps) + 1
 
-        for i in range(middle_index + 1):
-            top_index = middle_index - i
-            bottom_index = middle_index + i
+    def render_frame(self, frame_index, fps):
+        self.scheduler.seek(frame_index / fps)
+        self.compositor.present()
+        return self.screen
 
-            if top_index >= 0:
-                top_y_position = start_y + top_index * square_size
-                stock_line_top = sorted_lines[top_index]
-                stock_line_top.move(top_y_position)
-                stock_line_top.draw()
+    def render_frames(self, fps, start=0, stop=None):
+        stop = stop if stop is not None else self.count_frames(fps)
+        for frame_index in range(start, stop):
+            if frame_index == start:
+                self.scheduler.seek(frame_index / fps)
+            else:
+                self.scheduler.advance_to(frame_index / fps)
+            self.compositor.present()
+            yield frame_index, self.screen
+
+    def start_live(self):
+        self.clear()
+        self.draw_objects["Main Border"].draw()
+        self.draw_objects["Timeline"].draw(0)
+        self.live_elapsed = 0
+
+    def update_live(self, session):
+        changed = session.drain()
+        if changed is None:
+            return
+        self.draw_objects["Heatmap"].update_columns(session.percents, *changed)
+        timeline = self.draw_objects["Timeline"]
+        for elapsed in range(self.live_elapsed + 1, session.num_filled + 1):
+            timeline.draw(elapsed)
+        self.live_elapsed = max(self.live_elapsed, session.num_filled)
+
+    def run_live(self, session, poller):
+        # the poller fetches on its own thread, this loop only drains what it has queued
+        self.start_live()
+        poller.start()
+        running = True
+        while running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+            with Trace.span('frame', 'view'):
+                self.update_live(session)
+                self.compositor.present()
+            Trace.record_frame(self.clock.tick(30) / 1000, 30)
+        poller.stop()
+        pygame.quit()
 
-            if bottom_index < len(sorted_lines) and bottom_index != top_index:
-                bottom_y_position = start_y + bottom_index * square_size
-                stock_line_bottom = sorted_lines[bottom_index]
-                stock_line_bottom.move(bottom_y_position)
-                stock_line_bottom.draw()
+    def run_streaming(self, session, fetcher):
+        # rows fill in as the fetcher delivers them, the recap then plays from the saved snapshot
+        self.clear()
+        self.draw_objects["Main Border"].draw()
+        fetcher.start()
+        running = True
+        while running and not session.finished:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+            with Trace.span('frame', 'view'):
+                rows = session.drain()
+                if rows:
+                    self.draw_objects["Heatmap"].update_rows(session.percents, rows)
+                self.compositor.present()
+            Trace.record_frame(self.clock.tick(30) / 1000, 30)
 
-            pygame.display.flip()
-            self.clock.tick(60)
+        if not running:
+            pygame.quit()
+            return
+        fetcher.join()
+        if fetcher.snapshot_filepath() is None:
+            print("No snapshot was saved, rerun to resume the fetch")
+            pygame.quit()
+            return
+        # rows streamed in at full size, the recap itself can aggregate a large universe again
+        self.level_of_detail = True
+        self.load_snapshot(Snapshot.load(fetcher.snapshot_filepath()))
+        self.run()
 
     def run(self):
         running = True
+        self.clock.tick()
         while running:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
-            self.draw()
+            frame_seconds = self.clock.tick(60) / 1000
+            Trace.record_frame(frame_seconds, 60)
+            with Trace.span('frame', 'view'):
+                self.scheduler.update(frame_seconds)
+                self.compositor.present()
         pygame.quit()
@@ -0,0 +1,112 @@
+import contextlib
+import io
+
+import numpy as np
+import pygame
+import pytest
+
+import DrawObject
+import View
+from Snapshot import Snapshot
+
+
+def make_snapshot(num_tickers=120, num_minutes=390, seed=0):
+    rng = np.random.default_rng(seed)
+    minutes = [f"{(570 + i) // 60:02d}:{(570 + i) % 60:02d}" for i in range(num_minutes)]
+    percents = np.cumsum(rng.normal(0, 0.002, (num_tickers, num_minutes)), axis=1).astype(np.float32)
+    market_caps = sorted(rng.uniform(1e9, 1e12, num_tickers).tolist(), reverse=True)
+    return Snapshot([f"T{i:03d}" for i in range(num_tickers)], market_caps, minutes, percents, '2024-09-20')
+
+
+def make_canvas(snapshot, color_scale='default'):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return View.Canvas(snapshot=snapshot, headless=True, color_scale=color_scale)
+
+
+def screen_pixels(canvas):
+    return pygame.surfarray.array3d(canvas.screen)
+
+
+@pytest.mark.parametrize('seconds', [3.0, 8.0, 9.7, 11.5, 14.0, 17.0, 30.0])
+def test_recolor_mid_animation_matches_a_fresh_render(seconds):
+    snapshot = make_snapshot()
+    recolored = make_canvas(snapshot)
+    recolored.render_frame(int(seconds * 60), 60)
+    recolored.set_color_scale('blue_orange')
+
+    fresh = make_canvas(snapshot, 'blue_orange')
+    fresh.render_frame(int(seconds * 60), 60)
+    assert np.array_equal(screen_pixels(recolored), screen_pixels(fresh))
+
+
+def test_subblocks_fill_with_their_average_colour():
+    canvas = make_canvas(make_snapshot())
+    canvas.render_frame(canvas.count_frames(60) - 1, 60)
+    stock_block = canvas.draw_objects["Main Stock Block"]
+    for subblock in stock_block.subblocks:
+        geometry = subblock.geometry
+        expected = canvas.color_scale.color(subblock.average_block())
+        for x in (geometry.x, geometry.x + geometry.width // 2, geometry.x + geometry.width - 1):
+            assert tuple(canvas.screen.get_at((x, geometry.y + geometry.num_lines // 2)))[:3] == expected
+
+
+def heatmap_pixels(canvas):
+    heatmap = canvas.draw_objects["Heatmap"]
+    area = (*heatmap.pos, heatmap.surface.get_width(), heatmap.surface.get_height())
+    return pygame.surfarray.array3d(canvas.screen.subsurface(area)).transpose(1, 0, 2).astype(int)
+
+
+def test_highlight_dims_returns_outside_the_band():
+    canvas = make_canvas(make_snapshot())
+    canvas.render_frame(8 * 60, 60)
+    heatmap = canvas.draw_objects["Heatmap"]
+    indices = heatmap.surface.arrays()
+    before = heatmap_pixels(canvas)
+
+    canvas.highlight_returns(0, 0.01)
+    # the band edges fall on the ramp's levels
+    percents = np.asarray(canvas.snapshot.percents, dtype=np.float64)
+    levels = np.where(percents > 0, 1, -1) * canvas.color_scale.intensities(percents).astype(int)
+    inside = (levels >= 0) & (levels <= canvas.color_scale.signed_intensity(0.01))
+    highlighted = heatmap_pixels(canvas)
+    assert inside.any() and not inside.all()
+    assert np.array_equal(highlighted[inside], before[inside])
+    assert np.array_equal(highlighted[~inside], (before[~inside] * 0.25).astype(int))
+    # only the palettes changed
+    assert all(np.array_equal(a, b) for a, b in zip(indices, heatmap.surface.arrays()))
+
+    canvas.clear_highlight()
+    assert np.array_equal(heatmap_pixels(canvas), before)
+
+
+def test_fade_scales_the_heatmap_palette():
+    canvas = make_canvas(make_snapshot())
+    canvas.render_frame(8 * 60, 60)
+    before = heatmap_pixels(canvas)
+
+    canvas.fade_heatmap(0.5)
+    assert np.array_equal(heatmap_pixels(canvas), (before * 0.5).astype(int))
+    canvas.fade_heatmap(0)
+    assert not heatmap_pixels(canvas).any()
+
+
+def test_timeline_fades_to_black():
+    canvas = make_canvas(make_snapshot())
+    timeline = canvas.draw_objects["Timeline"]
+    timeline.reveal(1)
+    _, bounds = timeline.fade_surface()
+    before = pygame.surfarray.array3d(canvas.screen.subsurface(bounds))
+
+    timeline.fade_out(0)
+    # nothing changes before the first step
+    assert np.array_equal(pygame.surfarray.array3d(canvas.screen.subsurface(bounds)), before)
+    timeline.fade_out(0.5, 0)
+    halfway = pygame.surfarray.array3d(canvas.screen.subsurface(bounds))
+    assert 0 < halfway.max() < before.max()
+    timeline.fade_out(1, 0.5)
+    assert not pygame.surfarray.array3d(canvas.screen.subsurface(bounds)).any()
+
+
+def test_unknown_color_scale():
+    with pytest.raises(ValueError):
+        DrawObject.get_color_scale('sepia')
@@ -0,0 +1,69 @@
+import contextlib
+import io
+
+import numpy as np
+import pygame
+import pytest
+
+import Export
+import View
+from RangeStore import RangeStore
+from Snapshot import Snapshot
+
+DAYS = ['2024-09-16', '2024-09-17', '2024-09-18']
+MINUTES = [f"{(570 + i) // 60:02d}:{(570 + i) % 60:02d}" for i in range(390)]
+
+
+def make_snapshot(day, tickers, seed):
+    rng = np.random.default_rng(seed)
+    percents = np.cumsum(rng.normal(0, 0.002, (len(tickers), len(MINUTES))), axis=1).astype(np.float32)
+    market_caps = sorted(rng.uniform(1e9, 1e12, len(tickers)).tolist(), reverse=True)
+    return Snapshot(tickers, market_caps, MINUTES, percents, day)
+
+
+@pytest.fixture
+def data_directory(tmp_path):
+    # three sessions with a few tickers coming and going, as a range and as single days
+    store = RangeStore(str(tmp_path))
+    universe = [f"T{i:03d}" for i in range(130)]
+    for index, day in enumerate(DAYS):
+        tickers = universe[index * 5:index * 5 + 120]
+        make_snapshot(day, tickers, index).save(str(tmp_path / f"{day}.snap"))
+        store.add(day, f"{day}.snap", tickers)
+    return tmp_path
+
+
+def make_canvas(data_directory, kind):
+    with contextlib.redirect_stdout(io.StringIO()):
+        if kind == 'range':
+            return View.Canvas(headless=True, directory=str(data_directory), date_range=(DAYS[0], DAYS[-1]))
+        return View.Canvas(headless=True, data_filepath=str(data_directory / f"{DAYS[-1]}.snap"),
+                           sort_by_close=kind == 'sorted')
+
+
+@pytest.mark.parametrize('kind', ['session', 'sorted', 'range'])
+def test_sequential_frames_match_seeking_each_frame(data_directory, kind):
+    fps = 10
+    sequential = make_canvas(data_directory, kind)
+    seeking = make_canvas(data_directory, kind)
+    num_frames = sequential.count_frames(fps)
+    for frame_index, frame in sequential.render_frames(fps):
+        # every frame when it's cheap, the range only at a spread of indices
+        if kind == 'range' and frame_index % 7:
+            continue
+        expected = pygame.image.tobytes(seeking.render_frame(frame_index, fps), 'RGB')
+        assert pygame.image.tobytes(frame, 'RGB') == expected, frame_index
+    assert frame_index == num_frames - 1
+
+
+def test_parallel_export_matches_one_worker(data_directory):
+    data_filepath = str(data_directory / f"{DAYS[-1]}.snap")
+    outputs = []
+    for workers in (1, 3):
+        pipe = io.BytesIO()
+        with contextlib.redirect_stderr(io.StringIO()):
+            num_frames = Export.export_frames(data_filepath, 540, 960, 5, pipe=pipe, workers=workers, chunk_size=16,
+                                              sort_by_close=True)
+        outputs.append(pipe.getvalue())
+    assert len(outputs[0]) == num_frames * 540 * 960 * 3
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pygame
+import pytest
+
+import DrawObject
+from View import Compositor
+
+
+def get_color(percent):
+    # the per-square colour and drawing the heatmap replaced, kept verbatim as the reference it must match
+    norm = abs(percent) / 0.05 if abs(percent) < 0.05 else 1
+    return (0, int(norm * 255), 0) if percent > 0 else (int(norm * 255), 0, 0)
+
+
+class StockSquare:
+    def __init__(self, screen, pos, size, percent):
+        self.screen = screen
+        self.pos = pos
+        self.color = get_color(percent)
+        self.size = size
+        self.draw()
+
+    def draw(self):
+        pygame.draw.rect(self.screen, self.color, (self.pos[0], self.pos[1], self.size, self.size))
+
+
+def reference_pixels(size, origin, percents, square_size, columns=None):
+    screen = pygame.Surface(size)
+    for stock_index, row in enumerate(percents.tolist()):
+        for minute_index, percent in enumerate(row[:columns]):
+            StockSquare(screen, (origin[0] + minute_index * square_size, origin[1] + stock_index * square_size),
+                        square_size, percent)
+    return pygame.surfarray.array3d(screen)
+
+
+def make_view(width, height, color_scale='default'):
+    pygame.init()
+    screen = pygame.Surface((width, height))
+    return SimpleNamespace(screen=screen, compositor=Compositor(screen, display=False),
+                           color_scale=DrawObject.COLOR_SCALES[color_scale])
+
+
+def sample_percents(rows=24, columns=50, seed=0):
+    rng = np.random.default_rng(seed)
+    percents = rng.normal(0, 0.03, (rows, columns))
+    # flat, tiny, exactly at the clamp and well past it on both sides
+    percents[0, :6] = [0.0, 1e-6, -1e-6, 0.05, -0.05, 0.2]
+    percents[1, :2] = [-0.2, -0.049]
+    return percents.astype(np.float32)
+
+
+@pytest.mark.parametrize('square_size', [1, 3])
+def test_heatmap_matches_the_per_square_drawing(square_size):
+    percents = sample_percents()
+    view = make_view(200, 120)
+    heatmap = DrawObject.Heatmap(view, (10, 20), percents, square_size)
+
+    heatmap.draw()
+    expected = reference_pixels((200, 120), (10, 20), percents, square_size)
+    assert np.array_equal(pygame.surfarray.array3d(view.screen), expected)
+
+
+def test_reveal_draws_columns_up_to_progress():
+    percents = sample_percents()
+    view = make_view(60, 30)
+    heatmap = DrawObject.Heatmap(view, (0, 0), percents)
+
+    heatmap.reveal(0.5)
+    shown = int(0.5 * 51) + 1
+    expected = reference_pixels((60, 30), (0, 0), percents, 1, columns=shown)
+    assert np.array_equal(pygame.surfarray.array3d(view.screen), expected)
+
+    heatmap.reveal(1, 0.5)
+    expected = reference_pixels((60, 30), (0, 0), percents, 1)
+    assert np.array_equal(pygame.surfarray.array3d(view.screen), expected)
+
+
+def test_updates_match_the_per_square_drawing():
+    percents = sample_percents()
+    view = make_view(120, 60)
+    heatmap = DrawObject.Heatmap(view, (0, 0), percents, 2)
+
+    updated = sample_percents(seed=1)
+    heatmap.update_columns(updated, 10, 20)
+    heatmap.update_rows(updated, [3, 7])
+    heatmap.draw()
+    expected = percents.copy()
+    expected[:, 10:20] = updated[:, 10:20]
+    expected[[3, 7]] = updated[[3, 7]]
+    assert np.array_equal(pygame.surfarray.array3d(view.screen), reference_pixels((120, 60), (0, 0), expected, 2))
+
+
+def test_recolor_matches_a_heatmap_built_with_the_new_scale():
+    percents = sample_percents()
+    recolored = make_view(60, 30)
+    heatmap = DrawObject.Heatmap(recolored, (0, 0), percents)
+    heatmap.recolor(DrawObject.COLOR_SCALES['blue_orange'])
+    heatmap.draw()
+
+    fresh = make_view(60, 30, 'blue_orange')
+    DrawObject.Heatmap(fresh, (0, 0), percents).draw()
+    assert np.array_equal(pygame.surfarray.array3d(recolored.screen), pygame.surfarray.array3d(fresh.screen))
+
+
+def test_default_scale_matches_get_color():
+    color_scale = DrawObject.COLOR_SCALES['default']
+    percents = np.concatenate([np.linspace(-0.08, 0.08, 641), sample_percents().ravel().astype(np.float64)])
+    for percent in percents.tolist():
+        assert color_scale.color(percent) == get_color(percent), percent
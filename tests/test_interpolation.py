@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import Data
+
+
+def reference_interpolation(minutes, percents):
+    # the per-minute gap filling interpolate_universe replaced, kept as the reference it must match exactly
+    full_minutes = []
+    start_time = datetime.strptime("09:30", "%H:%M")
+    end_time = datetime.strptime("15:59", "%H:%M")
+    current_time = start_time
+
+    while current_time <= end_time:
+        full_minutes.append(current_time.strftime("%H:%M"))
+        current_time += timedelta(minutes=1)
+
+    original_data = dict(zip(minutes, percents))
+    interpolated_percents = []
+
+    for minute in full_minutes:
+        if minute in original_data:
+            interpolated_percents.append(original_data[minute])
+        else:
+            earlier_minute = max([m for m in minutes if m < minute], default=None)
+            later_minute = min([m for m in minutes if m > minute], default=None)
+
+            if earlier_minute and later_minute:
+                time_diff = (datetime.strptime(later_minute, "%H:%M") - datetime.strptime(earlier_minute,
+                                                                                             "%H:%M")).total_seconds()
+                weight = (datetime.strptime(minute, "%H:%M") - datetime.strptime(earlier_minute,
+                                                                                    "%H:%M")).total_seconds() / time_diff
+
+                interpolated_value = (1 - weight) * original_data[earlier_minute] + weight * original_data[
+                    later_minute]
+                interpolated_percents.append(interpolated_value)
+            elif earlier_minute:
+                interpolated_percents.append(original_data[earlier_minute])
+            elif later_minute:
+                interpolated_percents.append(original_data[later_minute])
+            else:
+                interpolated_percents.append(0)
+
+    return interpolated_percents
+
+
+def minute_label(offset):
+    minute = 9 * 60 + 30 + offset
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def bars(offsets, rng):
+    return [minute_label(offset) for offset in offsets], rng.normal(0, 0.01, len(offsets)).tolist()
+
+
+def assert_matches_reference(cases):
+    filled = Data.interpolate_universe([minutes for minutes, _ in cases], [percents for _, percents in cases])
+    assert filled.shape == (len(cases), 390)
+    for row, (minutes, percents) in zip(filled, cases):
+        expected = np.array(reference_interpolation(minutes, percents), dtype=np.float64)
+        # bit for bit, not approximately
+        assert np.array_equal(row, expected)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_gaps_match_reference(seed):
+    rng = np.random.default_rng(seed)
+    cases = []
+    for _ in range(40):
+        keep = rng.random(390) >= rng.uniform(0, 0.9)
+        cases.append(bars(np.flatnonzero(keep), rng))
+    assert_matches_reference(cases)
+
+
+def test_leading_and_trailing_gaps_match_reference():
+    rng = np.random.default_rng(1)
+    cases = [
+        bars(range(30, 390), rng),
+        bars(range(0, 350), rng),
+        bars(range(45, 300, 7), rng),
+        bars([200], rng),
+        bars([0], rng),
+        bars([389], rng),
+    ]
+    assert_matches_reference(cases)
+
+
+def test_ticker_without_bars_is_zero():
+    rng = np.random.default_rng(2)
+    cases = [([], []), bars(range(0, 390, 3), rng), ([], [])]
+    filled = Data.interpolate_universe([minutes for minutes, _ in cases], [percents for _, percents in cases])
+    assert not filled[0].any() and not filled[2].any()
+    assert_matches_reference(cases)
+
+
+def test_bars_outside_the_session_are_neighbours():
+    rng = np.random.default_rng(3)
+    cases = [
+        # pre-market and after-hours bars only
+        bars([-20, -5, 395, 410], rng),
+        # a pre-market bar before the first regular one, an after-hours bar after the last
+        bars([-3] + list(range(10, 380, 11)) + [392], rng),
+        # nothing inside the session but one early bar
+        bars([-1], rng),
+    ]
+    assert_matches_reference(cases)
+
+
+def test_complete_session_is_unchanged():
+    rng = np.random.default_rng(4)
+    minutes, percents = bars(range(390), rng)
+    filled = Data.interpolate_universe([minutes], [percents])
+    assert np.array_equal(filled[0], np.array(percents))
@@ -0,0 +1,43 @@
+import numpy as np
+
+import Layout
+from RangeStore import RangeMatrix, RangeSnapshot
+from Snapshot import Snapshot
+
+
+def make_range(num_days=3, num_tickers=40, num_minutes=390, seed=0):
+    rng = np.random.default_rng(seed)
+    minutes = [f"{(570 + i) // 60:02d}:{(570 + i) % 60:02d}" for i in range(num_minutes)]
+    tickers = [f"T{i:03d}" for i in range(num_tickers)]
+    market_caps = sorted(rng.uniform(1e9, 1e12, num_tickers).tolist(), reverse=True)
+    # two groups of tickers that move together
+    factors = rng.normal(0, 0.002, (2, num_days * num_minutes))
+    paths = factors[np.arange(num_tickers) % 2] + rng.normal(0, 0.0005, (num_tickers, num_days * num_minutes))
+    days = []
+    for day in range(num_days):
+        percents = np.cumsum(paths[:, day * num_minutes:(day + 1) * num_minutes], axis=1).astype(np.float32)
+        days.append(Snapshot(tickers, market_caps, minutes, percents, f"2024-09-{16 + day}"))
+    return RangeSnapshot(days)
+
+
+def test_correlation_layout_keeps_a_range_lazy():
+    snapshot = make_range()
+    reordered = Layout.apply_layout(snapshot, 'correlation')
+
+    assert isinstance(reordered.percents, RangeMatrix)
+    assert reordered.sessions == snapshot.sessions
+    assert list(reordered.percents.column_starts) == list(snapshot.percents.column_starts)
+    order = Layout.get_order(snapshot, 'correlation')
+    assert reordered.tickers == [snapshot.tickers[row] for row in order]
+    assert np.array_equal(np.asarray(reordered.percents), np.asarray(snapshot.percents)[order])
+    # the correlated groups end up in one block each
+    groups = np.arange(40)[order] % 2
+    assert np.count_nonzero(np.diff(groups)) == 1
+
+
+def test_correlation_layout_of_a_single_session_is_unchanged():
+    snapshot = make_range(num_days=1).days[0]
+    reordered = Layout.apply_layout(snapshot, 'correlation')
+    order = Layout.correlation_order(snapshot.percents)
+    assert type(reordered) is Snapshot
+    assert np.array_equal(reordered.percents, snapshot.percents[order])
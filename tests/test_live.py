@@ -0,0 +1,81 @@
+import queue
+from datetime import date, datetime
+
+import numpy as np
+
+import Calendar
+import Live
+import Providers
+
+SESSION = date(2024, 9, 20)
+LAST_CLOSE = date(2024, 9, 19)
+MINUTES = [f"{(570 + i) // 60:02d}:{(570 + i) % 60:02d}" for i in range(390)]
+
+
+class LateProvider(Providers.SyntheticProvider):
+    # generated bars where some tickers' bars from a given minute on only show up once released
+    def __init__(self, num_tickers=6, late=None):
+        super().__init__(num_tickers=num_tickers)
+        self.late = dict(late or {})
+
+    def get_minute_bars(self, ticker, date):
+        minutes, closes = super().get_minute_bars(ticker, date)
+        if ticker in self.late:
+            kept = [(minute, close) for minute, close in zip(minutes, closes) if minute < self.late[ticker]]
+            minutes, closes = [minute for minute, _ in kept], [close for _, close in kept]
+        return minutes, closes
+
+
+def expected_percents(provider, ticker):
+    minutes, closes = Providers.SyntheticProvider.get_minute_bars(provider, ticker, SESSION)
+    previous_close = provider.get_previous_close(ticker, LAST_CLOSE)
+    return np.array([(close - previous_close) / previous_close for close in closes], dtype=np.float32)
+
+
+def make_live(provider, hour, minute):
+    clock = Live.SimulatedClock(Calendar.EASTERN.localize(datetime(2024, 9, 20, hour, minute)), speed=0)
+    updates = queue.Queue()
+    tickers = provider.tickers
+    session = Live.LiveSession(tickers, [1] * len(tickers), MINUTES, SESSION, updates)
+    poller = Live.LivePoller(Providers.ClockedProvider(provider, clock), tickers, SESSION, LAST_CLOSE, MINUTES,
+                             updates, clock, max_workers=2)
+    return clock, session, poller
+
+
+def test_only_closed_minutes_are_drawn():
+    provider = LateProvider()
+    clock, session, poller = make_live(provider, 9, 40)
+
+    # the 9:40 bar is still forming
+    assert poller.poll() == 10
+    assert session.drain() == (0, 10)
+    assert session.received[:, :10].all() and not session.received[:, 10:].any()
+    assert not session.percents[:, 10:].any()
+    for row, ticker in enumerate(provider.tickers):
+        assert np.array_equal(session.percents[row, :10], expected_percents(provider, ticker)[:10])
+
+    # nothing new until the clock moves on
+    poller.poll()
+    assert session.drain() is None
+    clock.advance(5)
+    poller.poll()
+    assert session.drain() == (10, 15)
+    assert session.received[:, :15].all()
+
+
+def test_missing_minutes_are_filled_then_overwritten_by_late_bars():
+    provider = LateProvider(late={'SYN0002': '09:33'})
+    clock, session, poller = make_live(provider, 9, 40)
+    expected = expected_percents(provider, 'SYN0002')
+
+    poller.poll()
+    assert session.drain() == (0, 10)
+    # the last known return held across the minutes with no bar yet
+    assert not session.received[2, 3:10].any()
+    assert np.all(session.percents[2, 3:10] == expected[2])
+
+    del provider.late['SYN0002']
+    poller.poll()
+    assert session.drain() == (3, 10)
+    assert session.received[2, :10].all()
+    assert np.array_equal(session.percents[2, :10], expected[:10])
@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+import time
+from datetime import date
+
+import numpy as np
+import pytest
+
+import Data
+import Providers
+from Snapshot import Snapshot
+
+SESSION = date(2024, 9, 20)
+LAST_CLOSE = date(2024, 9, 19)
+
+
+class FakeProvider(Providers.SyntheticProvider):
+    # generated bars behind a simulated network: every request waits, some tickers fail a few times first
+    def __init__(self, num_tickers=40, latency=0.01, flaky=None, dead=(), latency_seed=0):
+        super().__init__(num_tickers=num_tickers)
+        self.latency = latency
+        self.flaky = dict(flaky or {})
+        self.dead = set(dead)
+        self.tickers = self.tickers + sorted(self.dead)
+        self.calls = {}
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.latency_rng = np.random.default_rng(latency_seed)
+
+    def get_minute_bars(self, ticker, date):
+        with self.lock:
+            self.calls[ticker] = self.calls.get(ticker, 0) + 1
+            attempt = self.calls[ticker]
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            # uneven latency so tickers finish out of order
+            latency = self.latency * self.latency_rng.uniform(0.5, 2)
+        try:
+            # an Event wait rather than time.sleep, which the tests watch for backoff
+            threading.Event().wait(latency)
+            if ticker in self.dead or attempt <= self.flaky.get(ticker, 0):
+                raise ConnectionError(f"simulated outage for {ticker}")
+            return super().get_minute_bars(ticker, date)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+@pytest.fixture(autouse=True)
+def working_directory(tmp_path, monkeypatch):
+    # the calendar cache is written relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+    real_sleep = time.sleep
+
+    def sleep(seconds):
+        recorded.append(seconds)
+        real_sleep(seconds)
+
+    monkeypatch.setattr(Data.time, 'sleep', sleep)
+    return recorded
+
+
+def fetch(provider, directory, **kwargs):
+    return Data.SP500Data(provider=provider, tickers=provider.tickers, date=SESSION, last_close=LAST_CLOSE,
+                          directory=str(directory), **kwargs)
+
+
+def test_fetches_concurrently_within_the_worker_bound(tmp_path):
+    provider = FakeProvider(num_tickers=40)
+    data = fetch(provider, tmp_path / 'concurrent', max_workers=4)
+
+    assert len(data.stock_objects) == 40
+    assert provider.max_active == 4
+
+
+def test_single_worker_fetches_one_at_a_time(tmp_path):
+    provider = FakeProvider(num_tickers=10)
+    fetch(provider, tmp_path / 'sequential', max_workers=1)
+
+    assert provider.max_active == 1
+
+
+def test_retries_with_exponential_backoff(tmp_path, sleeps):
+    provider = FakeProvider(num_tickers=5, flaky={'SYN0001': 2}, dead=['DEAD'])
+    data = fetch(provider, tmp_path / 'retries', max_workers=2, retries=3, backoff=0.01)
+
+    assert provider.calls['SYN0001'] == 3
+    assert 'SYN0001' in data.stock_objects
+    assert provider.calls['DEAD'] == 3
+    assert provider.calls['SYN0000'] == 1
+    # two waits per ticker that needed a third attempt, doubling each time, none after the last attempt
+    assert sorted(sleeps) == pytest.approx([0.01, 0.01, 0.02, 0.02])
+
+
+def test_failures_are_summarised(tmp_path, capsys):
+    provider = FakeProvider(num_tickers=5, dead=['DEAD', 'GONE'])
+    data = fetch(provider, tmp_path / 'failures', retries=2, backoff=0)
+
+    assert set(data.failures) == {'DEAD', 'GONE'}
+    assert all(isinstance(error, ConnectionError) for error in data.failures.values())
+    output = capsys.readouterr().out
+    assert "Fetched 5 stocks, 2 failed" in output
+    assert "  DEAD: simulated outage for DEAD" in output
+    assert "  GONE: simulated outage for GONE" in output
+    # a couple of failures still leave a snapshot, without the failed rows
+    assert Snapshot.load(data.snapshot_filepath).tickers == sorted(
+        data.stock_objects, key=lambda ticker: -data.stock_objects[ticker].market_cap)
+
+
+def test_too_many_failures_skip_the_save(tmp_path, capsys):
+    provider = FakeProvider(num_tickers=3, dead=['DEAD', 'GONE'])
+    data = fetch(provider, tmp_path / 'skipped', retries=1, max_failures=1)
+
+    assert data.snapshot_filepath is None
+    assert "Not saving a snapshot with 2 failed tickers" in capsys.readouterr().out
+
+
+def test_snapshot_matches_a_sequential_run(tmp_path):
+    sequential = fetch(FakeProvider(num_tickers=30, flaky={'SYN0003': 1}), tmp_path / 'sequential',
+                       max_workers=1, backoff=0)
+    concurrent = fetch(FakeProvider(num_tickers=30, flaky={'SYN0003': 1}, latency_seed=1), tmp_path / 'concurrent',
+                       max_workers=8, backoff=0)
+
+    expected = Snapshot.load(sequential.snapshot_filepath)
+    actual = Snapshot.load(concurrent.snapshot_filepath)
+    assert actual.tickers == expected.tickers
+    assert actual.market_caps == expected.market_caps
+    assert actual.minutes == expected.minutes
+    assert np.array_equal(np.asarray(actual.percents), np.asarray(expected.percents))
+
+
+def checkpoint_lines(data):
+    with open(data.checkpoint_path()) as file:
+        return file.read().splitlines(keepends=True)
+
+
+def interrupted_run(directory):
+    # one ticker keeps failing, so the run stops before saving and leaves its checkpoint behind
+    data = fetch(FakeProvider(num_tickers=10, flaky={'SYN0004': 5}), directory, retries=1, max_failures=0)
+    assert data.snapshot_filepath is None
+    assert len(checkpoint_lines(data)) == 9
+    return data
+
+
+def assert_matches_a_fresh_run(data, directory):
+    fresh = fetch(FakeProvider(num_tickers=10), directory)
+    expected = Snapshot.load(fresh.snapshot_filepath)
+    actual = Snapshot.load(data.snapshot_filepath)
+    assert actual.tickers == expected.tickers
+    assert np.array_equal(np.asarray(actual.percents), np.asarray(expected.percents))
+    assert not os.path.exists(data.checkpoint_path())
+
+
+def test_rerun_resumes_from_the_checkpoint(tmp_path, capsys):
+    interrupted_run(tmp_path / 'data')
+    provider = FakeProvider(num_tickers=10)
+    data = fetch(provider, tmp_path / 'data')
+
+    assert "Resuming from" in capsys.readouterr().out
+    assert provider.calls == {'SYN0004': 1}
+    assert_matches_a_fresh_run(data, tmp_path / 'fresh')
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    interrupted = interrupted_run(tmp_path / 'data')
+    lines = checkpoint_lines(interrupted)
+    torn = lines[-1][:len(lines[-1]) // 2]
+    with open(interrupted.checkpoint_path(), 'w') as file:
+        file.write("".join(lines[:-1]) + torn)
+
+    provider = FakeProvider(num_tickers=10)
+    data = fetch(provider, tmp_path / 'data')
+    assert provider.calls == {'SYN0004': 1, json.loads(lines[-1])['ticker']: 1}
+    assert_matches_a_fresh_run(data, tmp_path / 'fresh')
+
+
+def test_malformed_line_discards_the_rest_of_the_checkpoint(tmp_path, capsys):
+    interrupted = interrupted_run(tmp_path / 'data')
+    lines = checkpoint_lines(interrupted)
+    with open(interrupted.checkpoint_path(), 'w') as file:
+        file.write("".join(lines[:3]) + '{"ticker": "SYN0009", "minutes": \n' + "".join(lines[3:]))
+
+    provider = FakeProvider(num_tickers=10)
+    data = fetch(provider, tmp_path / 'data')
+    assert "it is malformed" in capsys.readouterr().out
+    # the three entries before the bad line are kept, everything from it on is fetched again
+    assert sorted(provider.calls) == sorted(set(provider.tickers) - {json.loads(line)['ticker'] for line in lines[:3]})
+    assert_matches_a_fresh_run(data, tmp_path / 'fresh')
@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+import pygame
+
+import DrawObject
+from View import Compositor
+
+
+def make_timeline(sessions=None, num_minutes=390, minute_step=1):
+    pygame.init()
+    screen = pygame.Surface((540, 300))
+    view = SimpleNamespace(screen=screen, compositor=Compositor(screen, display=False), width=540, height=300)
+    return DrawObject.Timeline(view, (40, 200), (255, 255, 255), num_minutes=num_minutes,
+                               minute_step=minute_step, sessions=sessions)
+
+
+def labels(timeline):
+    return [name[len("Time Label "):] for name in timeline.timeline_parts if name.startswith("Time Label")]
+
+
+def test_single_session_labels_hours():
+    timeline = make_timeline()
+    timeline.reveal(1)
+    assert labels(timeline) == ["10AM", "11AM", "12PM", "1PM", "2PM", "3PM"]
+
+
+def test_range_labels_each_session_once():
+    sessions = [(f"2024-09-{day}", "09:30", 390) for day in range(16, 21)]
+    timeline = make_timeline(sessions, num_minutes=390, minute_step=5)
+    shown = []
+    draw_time = timeline.draw_time
+    timeline.draw_time = lambda text, *args, **kwargs: (shown.append(text), draw_time(text, *args, **kwargs))
+    timeline.reveal(1)
+
+    assert labels(timeline) == ["MON 9/16", "TUE 9/17", "WED 9/18", "THU 9/19", "FRI 9/20"]
+    # the clock restarts at each session's open
+    assert shown[0] == "9/16 9:30 AM"
+    assert shown[78] == "9/17 9:30 AM"
+    assert shown[-2] == "9/20 3:55 PM"
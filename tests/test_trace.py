@@ -0,0 +1,84 @@
+import pytest
+
+import Animation
+import Trace
+
+
+@pytest.fixture
+def tracing():
+    Trace.reset()
+    Trace.enable()
+    yield
+    Trace.disable()
+    Trace.reset()
+
+
+def make_scheduler(calls):
+    animations = []
+    for scene, names in (('scene 1', ['reveal', 'unzip']), ('scene 2', ['split'])):
+        for name in names:
+            animation = Animation.Tween(lambda progress, previous, name=name: calls.append(name), 1.0)
+            animation.name = name
+            animation.scene = scene
+            animations.append(animation)
+    return Animation.Scheduler(animations)
+
+
+def test_summary_groups_animation_work_by_scene(tracing):
+    calls = []
+    scheduler = make_scheduler(calls)
+    while not scheduler.finished():
+        scheduler.update(0.25)
+
+    summary = Trace.summary()
+    assert set(summary['scenes']) == {'scene 1', 'scene 2'}
+    assert summary['scenes']['scene 1']['count'] == calls.count('reveal') + calls.count('unzip')
+    assert summary['scenes']['scene 2']['count'] == calls.count('split')
+    # one playback span per scene
+    assert summary['spans']['scene:scene 1']['count'] == 1
+    assert summary['spans']['scene:scene 2']['count'] == 1
+
+
+def test_scene_spans_reach_the_chrome_trace(tracing):
+    scheduler = make_scheduler([])
+    scheduler.advance_to(scheduler.duration + 1)
+
+    events = [event for event in Trace.chrome_trace()['traceEvents'] if event['cat'] == 'scene']
+    assert [event['name'] for event in events] == ['scene 1', 'scene 2']
+    assert events[0]['ts'] + events[0]['dur'] <= events[1]['ts'] + 1e-3
+
+
+def test_seek_replays_stay_out_of_the_scene_totals(tracing):
+    calls = []
+    scheduler = make_scheduler(calls)
+    scheduler.update(0.5)
+    scheduler.seek(2.5)
+    scheduler.seek(2.75)
+    while not scheduler.finished():
+        scheduler.update(0.25)
+
+    summary = Trace.summary()
+    replays = [event for event in Trace.chrome_trace()['traceEvents'] if event['args'].get('replay')]
+    assert len(replays) == len(calls) - summary['scenes']['scene 1']['count'] - summary['scenes']['scene 2']['count']
+    assert {event['args']['scene'] for event in replays} == {'scene 1', 'scene 2'}
+    # the first playback of scene 1, then scene 2 from the last seek to the end
+    scenes = [event for event in Trace.chrome_trace()['traceEvents'] if event['cat'] == 'scene']
+    assert [event['name'] for event in scenes] == ['scene 1', 'scene 2']
+
+
+def test_nothing_recorded_when_disabled():
+    Trace.reset()
+    scheduler = make_scheduler([])
+    scheduler.advance_to(scheduler.duration + 1)
+    assert Trace.summary()['spans'] == {} and Trace.summary()['scenes'] == {}
+
+
+def test_frames_are_judged_against_their_loop_rate(tracing):
+    for _ in range(100):
+        Trace.record_frame(1 / 30, 30)
+    assert Trace.frames.to_dict()['dropped_frames'] == 0
+
+    # a 30 fps frame in a 60 fps loop shows the previous frame for one extra refresh
+    Trace.record_frame(1 / 30, 60)
+    stats = Trace.frames.to_dict()
+    assert stats['dropped_frames'] == 1 and stats['target_fps'] == 60